@@ -0,0 +1,56 @@
+"""
+The desktop app's sweep, as it runs in a JobRunner worker.
+
+It lives apart from the app's script so that a worker only needs this module and
+simulation_program to run it; the rows it sends are those the app's tables show.
+"""
+import simulation_program
+
+
+def format_range(value):
+    """Renders a (low, high) tuple the way the results tables display it."""
+    return f"({value[0]}, {value[1]})"
+
+def result_to_row(result, num_parts, initial_inter_arrival_range):
+    """One row of the All Results table."""
+    return {
+        'machine_capacity': result.machine_capacity,
+        'processing_time': format_range(result.processing_time),
+        'interval': format_range(result.interval),
+        'num_parts': num_parts,
+        'inter_arrival_time': initial_inter_arrival_range,
+        'average_waiting_time': round(result.avg_waiting_time, 2),
+        'machine_utilization': round(result.machine_utilization, 2)
+    }
+
+def best_to_row(best, num_parts):
+    """The Best Configuration row for a best SimulationResult (or None)."""
+    if best is None:
+        return None
+    return {
+        'machine_capacity': best.machine_capacity,
+        'num_parts': num_parts,
+        'inter_arrival_time': format_range(best.interval),
+        'processing_time': format_range(best.processing_time),
+        'average_waiting_time': round(best.avg_waiting_time, 2),
+        'machine_utilization': round(best.machine_utilization, 2)
+    }
+
+def run_sweep(params, initial_inter_arrival_range, events):
+    """
+    Runs the sweep for params, putting (rows, best row, cells done, cells in total)
+    on events each time a cell finishes.
+    """
+    def on_progress(results, best, done, total):
+        rows = [
+            result_to_row(result, params['num_parts'], initial_inter_arrival_range)
+            for result in results if result.status == 'simulated'
+        ]
+        events.put((rows, best_to_row(best, params['num_parts']), done, total))
+
+    simulation_program.find_best_configuration(
+        params['random_seed'], params['num_parts'], params['processing_times'],
+        params['machine_capacities'], params['initial_inter_arrival_range'], on_progress=on_progress
+    )
+    # Written out now rather than when the worker exits, for the next sweep
+    simulation_program.RESULT_CACHE.flush()
@@ -0,0 +1,162 @@
+"""
+Profiling support for the simulation_program CLI (--profile).
+
+A Profiler collects, over every simulated run of a sweep:
+- wall time per phase (setup, env.run and metrics inside each run, plus whatever
+  phases the caller adds, such as the search itself and printing the results);
+- the number of SimPy events processed, via CountingEnvironment;
+- a cProfile profile of the runs, enabled only while a run is in progress;
+- stack samples of the simulating thread, taken by a background thread and written
+  as collapsed stacks ("outer;inner;leaf count" lines), the input format of
+  flamegraph.pl and speedscope.
+
+cProfile slows SimPy runs down several times, which inflates the phase timings.
+Profiler(use_cprofile=False) keeps only the sampler, whose overhead is small, and
+ranks functions by samples instead.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import simpy
+
+
+class CountingEnvironment(simpy.Environment):
+    """simpy.Environment that counts the events it processes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.event_count = 0
+
+    def step(self):
+        self.event_count += 1
+        super().step()
+
+
+class Profiler:
+    def __init__(self, sample_interval=0.001, use_cprofile=True):
+        self.sample_interval = sample_interval
+        self.use_cprofile = use_cprofile
+        self.phase_times = defaultdict(float)
+        self.phase_calls = Counter()
+        self.runs = 0
+        self.events = 0
+        self.stacks = Counter()
+        self._profile = cProfile.Profile() if use_cprofile else None
+        self._environments = []
+        self._sampling = threading.Event()
+        self._target_thread = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def environment(self):
+        """A fresh counting environment whose events are added to the totals."""
+        env = CountingEnvironment()
+        self._environments.append(env)
+        return env
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - start
+            self.phase_calls[name] += 1
+
+    @contextmanager
+    def run(self):
+        """Profiles one simulated run: cProfile and the stack sampler are on only inside."""
+        self._start_sampler()
+        self._target_thread = threading.get_ident()
+        self._sampling.set()
+        if self._profile:
+            self._profile.enable()
+        try:
+            yield
+        finally:
+            if self._profile:
+                self._profile.disable()
+            self._sampling.clear()
+            self.runs += 1
+            self.events += sum(env.event_count for env in self._environments)
+            self._environments.clear()
+
+    def close(self):
+        self._stop.set()
+        self._sampling.set()
+        if self._sampler:
+            self._sampler.join()
+
+    def _start_sampler(self):
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, name='profiler-sampler', daemon=True)
+            self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._sampling.wait()
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is not None and self._sampling.is_set():
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+    def report(self, top=25):
+        lines = ["Profile report", "=" * 60]
+        run_time = sum(self.phase_times.get(name, 0.0) for name in ('setup', 'env.run', 'metrics', 'numpy'))
+        lines.append(f"Simulated runs: {self.runs}")
+        if self.events:
+            env_run = self.phase_times.get('env.run', 0.0)
+            rate = self.events / env_run if env_run else float('inf')
+            lines.append(f"SimPy events: {self.events} ({rate:,.0f} events/sec in env.run)")
+        lines.append("")
+        lines.append(f"{'phase':<16} {'calls':>8} {'total (s)':>12} {'per call (ms)':>14} {'share of runs':>14}")
+        for name, total in self.phase_times.items():
+            calls = self.phase_calls[name]
+            share = f"{total / run_time:.1%}" if run_time and name in ('setup', 'env.run', 'metrics', 'numpy') else ''
+            lines.append(f"{name:<16} {calls:>8} {total:>12.3f} {total / calls * 1000:>14.3f} {share:>14}")
+
+        lines.append("")
+        if self._profile is None:
+            lines.extend(self._sample_report(top))
+            return "\n".join(lines)
+        lines.append(f"Top {top} functions by cumulative time (cProfile, runs only):")
+        buffer = io.StringIO()
+        try:
+            pstats.Stats(self._profile, stream=buffer).sort_stats('cumulative').print_stats(top)
+        except TypeError:
+            # Nothing was profiled (every run came from the cache)
+            buffer.write("  no runs profiled\n")
+        lines.append(buffer.getvalue().strip())
+        return "\n".join(lines)
+
+    def _sample_report(self, top):
+        total = sum(self.stacks.values())
+        if not total:
+            return ["No stack samples collected"]
+        inclusive, exclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            exclusive[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        lines = [f"Top {top} functions by samples ({total} samples):", f"{'inclusive':>10} {'self':>8}  function"]
+        for frame, count in inclusive.most_common(top):
+            lines.append(f"{count / total:>10.1%} {exclusive[frame] / total:>8.1%}  {frame}")
+        return lines
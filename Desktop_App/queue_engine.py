@@ -0,0 +1,173 @@
+"""
+Event-loop-free engine for the FactoryAnalysis model.
+
+The model in simulation_program.py is a plain FIFO queue in front of a pool of
+machine_capacity identical machines, so the waiting time of every part follows from
+the arrival and processing times alone (Kiefer-Wolfowitz recursion). This module
+draws those times up front with NumPy and evaluates the recursion directly:
+
+- one machine: Lindley's recursion, fully vectorized with a running minimum;
+- several machines: the workload vector kept as a heap of machine free times.
+
+Arrivals and services always come from dedicated streams, so runs with the same seed
+are on common random numbers whatever the parameters. simulate_batch runs many
+replications at once as 2-D arrays, advancing the recursion for all of them in
+lockstep; replication r of a batch is the same sample path as simulate(replication=r).
+"""
+import heapq
+import numpy as np
+
+
+def make_generators(random_seed, replication=0):
+    """Independent (arrival, service) generators for one seed/replication pair."""
+    arrival_seq, service_seq = np.random.SeedSequence([random_seed, replication]).spawn(2)
+    return np.random.default_rng(arrival_seq), np.random.default_rng(service_seq)
+
+def draw_samples(random_seed, num_parts, inter_arrival_time, processing_time, replication=0):
+    """Inter-arrival and processing times of num_parts parts."""
+    arrival_rng, service_rng = make_generators(random_seed, replication)
+    inter_arrivals = arrival_rng.uniform(*inter_arrival_time, size=num_parts)
+    services = service_rng.uniform(*processing_time, size=num_parts)
+    return inter_arrivals, services
+
+def fifo_waits(inter_arrivals, services, machine_capacity):
+    """
+    Waiting time of every part in a FIFO queue served by machine_capacity machines.
+
+    Returns (waits, makespan) where makespan is the time the last part leaves.
+    """
+    arrivals = np.cumsum(inter_arrivals)
+    if len(arrivals) == 0:
+        return np.zeros(0), 0.0
+
+    if machine_capacity == 1:
+        # Lindley: W[n] = C[n] - min(C[:n+1]) with C the cumulative S[n-1] - A[n]
+        increments = np.empty_like(arrivals)
+        increments[0] = 0.0
+        np.cumsum(services[:-1] - inter_arrivals[1:], out=increments[1:])
+        waits = increments - np.minimum.accumulate(increments)
+    else:
+        # free_at is the sorted workload vector: free_at[0] is the next machine to free up
+        free_at = [0.0] * machine_capacity
+        heapreplace = heapq.heapreplace
+        wait_list = []
+        append = wait_list.append
+        for arrival, service in zip(arrivals.tolist(), services.tolist()):
+            earliest = free_at[0]
+            if earliest > arrival:
+                append(earliest - arrival)
+                heapreplace(free_at, earliest + service)
+            else:
+                append(0.0)
+                heapreplace(free_at, arrival + service)
+        waits = np.array(wait_list)
+
+    makespan = float(np.max(arrivals + waits + services))
+    return waits, makespan
+
+def simulate(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, replication=0):
+    """Drop-in equivalent of run_simulation: returns (avg_waiting_time, machine_utilization)."""
+    summary = simulate_summary(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, replication)
+    return summary['avg_waiting_time'], summary['machine_utilization']
+
+def simulate_summary(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, replication=0):
+    """
+    simulate with the full run summary (the fields of simulation_program.RunSummary).
+
+    The waits are in memory anyway, so the percentiles here are exact. The time-average
+    queue length is the total wait over the makespan (Little's law on the queue).
+    """
+    if num_parts == 0:
+        return {'avg_waiting_time': 0, 'machine_utilization': 0}
+    inter_arrivals, services = draw_samples(random_seed, num_parts, inter_arrival_time, processing_time, replication)
+    waits, makespan = fifo_waits(inter_arrivals, services, machine_capacity)
+    p50, p95, p99 = np.percentile(waits, [50, 95, 99])
+    return {
+        'avg_waiting_time': float(waits.mean()),
+        'machine_utilization': float(services.sum()) / (makespan * machine_capacity) * 100,
+        'wait_stdev': float(waits.std(ddof=1)) if num_parts > 1 else 0.0,
+        'max_waiting_time': float(waits.max()),
+        'wait_p50': float(p50),
+        'wait_p95': float(p95),
+        'wait_p99': float(p99),
+        'avg_queue_length': float(waits.sum()) / makespan,
+    }
+
+def fifo_waits_batch(inter_arrivals, services, machine_capacity):
+    """
+    Batched fifo_waits: rows are replications, columns are parts.
+
+    Returns (avg_waits, makespans), one entry per replication.
+    """
+    replications, num_parts = inter_arrivals.shape
+    if num_parts == 0:
+        return np.zeros(replications), np.zeros(replications)
+    arrivals = np.cumsum(inter_arrivals, axis=1)
+
+    if machine_capacity == 1:
+        increments = np.zeros_like(arrivals)
+        np.cumsum(services[:, :-1] - inter_arrivals[:, 1:], axis=1, out=increments[:, 1:])
+        waits = increments - np.minimum.accumulate(increments, axis=1)
+        makespans = np.max(arrivals + waits + services, axis=1)
+        return waits.mean(axis=1), makespans
+
+    # Step through the parts with one sorted workload row per replication
+    arrivals_by_part = np.ascontiguousarray(arrivals.T)
+    services_by_part = np.ascontiguousarray(services.T)
+    free_at = np.zeros((replications, machine_capacity))
+    wait_sums = np.zeros(replications)
+    makespans = np.zeros(replications)
+    for arrival, service in zip(arrivals_by_part, services_by_part):
+        start = np.maximum(free_at[:, 0], arrival)
+        wait_sums += start - arrival
+        free_at[:, 0] = start + service
+        np.maximum(makespans, free_at[:, 0], out=makespans)
+        free_at.sort(axis=1)
+    return wait_sums / num_parts, makespans
+
+def simulate_batch(random_seed, replications, num_parts, inter_arrival_time, processing_time, machine_capacity,
+                   first_replication=0, chunk_size=256):
+    """
+    Run replications first_replication .. first_replication + replications - 1 at once.
+
+    Returns (avg_waiting_times, machine_utilizations) as arrays with one entry per
+    replication. Replications are processed chunk_size at a time to bound memory.
+    """
+    if num_parts == 0:
+        return np.zeros(replications), np.zeros(replications)
+    avg_waiting_times = np.empty(replications)
+    machine_utilizations = np.empty(replications)
+    for chunk_start in range(0, replications, chunk_size):
+        chunk = range(chunk_start, min(chunk_start + chunk_size, replications))
+        samples = [
+            draw_samples(random_seed, num_parts, inter_arrival_time, processing_time, first_replication + r)
+            for r in chunk
+        ]
+        inter_arrivals = np.stack([sample[0] for sample in samples])
+        services = np.stack([sample[1] for sample in samples])
+        avg_waits, makespans = fifo_waits_batch(inter_arrivals, services, machine_capacity)
+        avg_waiting_times[chunk.start:chunk.stop] = avg_waits
+        machine_utilizations[chunk.start:chunk.stop] = services.sum(axis=1) / (makespans * machine_capacity) * 100
+    return avg_waiting_times, machine_utilizations
+
+class MicroBatchArrays:
+    """Array counterpart of simulation_program.MicroBatches."""
+
+    def __init__(self, size, wait_means, service_sums, end_arrivals):
+        self.size = size
+        self.wait_means = wait_means
+        self.service_sums = service_sums
+        self.end_arrivals = end_arrivals
+
+def micro_batches(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, size=5, replication=0):
+    """One run reduced to groups of size consecutive parts, for batch-means analysis."""
+    inter_arrivals, services = draw_samples(random_seed, num_parts, inter_arrival_time, processing_time, replication)
+    waits, _ = fifo_waits(inter_arrivals, services, machine_capacity)
+    groups = num_parts // size
+    used = groups * size
+    return MicroBatchArrays(
+        size,
+        waits[:used].reshape(groups, size).mean(axis=1).tolist(),
+        services[:used].reshape(groups, size).sum(axis=1).tolist(),
+        np.cumsum(inter_arrivals)[size - 1:used:size].tolist(),
+    )
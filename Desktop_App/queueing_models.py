@@ -0,0 +1,102 @@
+"""
+Analytic approximations for the FactoryAnalysis model, used to pre-screen sweeps.
+
+Parts arrive with uniform inter-arrival times and are served FIFO by a pool of
+identical machines with uniform processing times: a GI/G/c queue. Its mean wait is
+approximated with Allen-Cunneen (the Erlang-C wait of the M/M/c queue scaled by the
+squared coefficients of variation of arrivals and services). Everything is vectorized,
+so a whole (capacity x processing time x interval) grid evaluates in one call.
+
+The approximations are steady-state, while a sweep simulates a finite number of parts.
+screen_grid therefore only discards cells that miss the criteria by a wide margin.
+"""
+import numpy as np
+
+
+def uniform_moments(bounds):
+    """Mean and squared coefficient of variation of uniform(low, high) draws."""
+    bounds = np.asarray(bounds, dtype=float)
+    low, high = bounds[..., 0], bounds[..., 1]
+    mean = (low + high) / 2
+    scv = ((high - low) ** 2 / 12) / mean ** 2
+    return mean, scv
+
+def erlang_c(servers, offered_load):
+    """
+    Probability that an arrival has to wait in an M/M/c queue (Erlang C).
+
+    servers and offered_load (arrival rate / service rate) broadcast against each other.
+    Returns 1 where the offered load reaches the number of servers.
+    """
+    servers, offered_load = np.broadcast_arrays(np.asarray(servers), np.asarray(offered_load, dtype=float))
+    # Erlang B by its stable recursion, B(k) = a B(k-1) / (k + a B(k-1)), stopped per element at c
+    blocking = np.ones(offered_load.shape)
+    for k in range(1, int(servers.max(initial=0)) + 1):
+        step = offered_load * blocking / (k + offered_load * blocking)
+        blocking = np.where(k <= servers, step, blocking)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        waiting = servers * blocking / (servers - offered_load * (1 - blocking))
+    return np.where(offered_load < servers, waiting, 1.0)
+
+def predict(machine_capacity, processing_time, interval):
+    """
+    Predicted (avg_waiting_time, machine_utilization) arrays for the given configurations.
+
+    processing_time and interval are (..., 2) arrays of (low, high) bounds; all three
+    arguments broadcast. Overloaded configurations get an infinite wait and 100%.
+    """
+    machine_capacity = np.asarray(machine_capacity)
+    mean_processing, processing_scv = uniform_moments(processing_time)
+    mean_inter_arrival, arrival_scv = uniform_moments(interval)
+
+    offered_load = mean_processing / mean_inter_arrival
+    rho = offered_load / machine_capacity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mmc_wait = erlang_c(machine_capacity, offered_load) * mean_processing / (machine_capacity - offered_load)
+    avg_waiting_time = np.where(rho < 1, mmc_wait * (arrival_scv + processing_scv) / 2, np.inf)
+    machine_utilization = np.minimum(rho, 1) * 100
+    return avg_waiting_time, machine_utilization
+
+def bisection_iterations(initial_inter_arrival_range, tolerance=0.1, max_iterations=10):
+    """Number of halvings one interval-halving cell makes (two simulations each)."""
+    width = initial_inter_arrival_range[1] - initial_inter_arrival_range[0]
+    iterations = 0
+    while width > tolerance and iterations < max_iterations:
+        width /= 2
+        iterations += 1
+    return iterations
+
+def screen_grid(machine_capacities, processing_times, initial_inter_arrival_range, tolerance=0.1, max_iterations=10,
+                target_utilization=95, max_wait=5, utilization_margin=5, wait_factor=10):
+    """
+    Flag the (capacity, processing time) cells that clearly cannot meet the criteria.
+
+    A cell is discarded when either
+    - even its heaviest reachable interval has a predicted utilization more than
+      utilization_margin points below target_utilization, or
+    - the interval that just reaches target_utilization (the lightest load at which
+      the utilization criterion holds) has a predicted wait above wait_factor * max_wait.
+
+    Returns a boolean (len(machine_capacities), len(processing_times)) array, True for
+    the cells that still need simulating.
+    """
+    capacities = np.asarray(machine_capacities)[:, None]
+    processing = np.asarray(processing_times, dtype=float)[None, :, :]
+    mean_processing, _ = uniform_moments(processing)
+    low, high = initial_inter_arrival_range
+
+    # The narrowest window the halving search reaches sits at the low end of the range
+    narrowest = (high - low) / 2 ** max(1, bisection_iterations(initial_inter_arrival_range, tolerance, max_iterations))
+    heaviest = np.broadcast_to(np.array([low, low + narrowest]), processing.shape)
+    _, max_utilization = predict(capacities, processing, heaviest)
+    reaches_target = max_utilization >= target_utilization - utilization_margin
+
+    # Lightest load that still meets the utilization target, with the narrowest (least
+    # variable, so lowest-wait) window the search uses
+    target_mean = mean_processing / (capacities * target_utilization / 100)
+    half_spread = np.minimum(narrowest / 2, target_mean * (1 - 1e-9))
+    target_interval = np.stack(np.broadcast_arrays(target_mean - half_spread, target_mean + half_spread), axis=-1)
+    target_wait, _ = predict(capacities, processing, target_interval)
+    meets_wait = target_wait <= wait_factor * max_wait
+
+    return reaches_target & meets_wait
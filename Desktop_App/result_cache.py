@@ -0,0 +1,166 @@
+"""
+Content-addressed cache for simulation results.
+
+Entries are keyed on a SHA-256 of the normalized run parameters plus a model version,
+so a change to the model code never serves stale numbers. Lookups go to an in-memory
+LRU first and then to an optional SQLite file, which is shared by every process that
+points at it (Flask workers, process pools, later CLI runs).
+
+The file is bounded: entries older than max_age seconds are ignored and deleted, and
+beyond max_disk_entries the oldest go first. New entries are written in batches of
+write_batch (or after flush_interval seconds), and whatever is left when the process
+exits, so a sweep does not pay for a commit per run.
+"""
+import json
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import util
+
+
+class ResultCache:
+    def __init__(self, path=None, max_entries=4096, model_version='', max_disk_entries=100000, max_age=7 * 24 * 3600,
+                 write_batch=64, flush_interval=2.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.model_version = model_version
+        self.max_disk_entries = max_disk_entries
+        self.max_age = max_age
+        self.write_batch = write_batch
+        self.flush_interval = flush_interval
+        self.enabled = max_entries > 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        # Entries not yet written to disk, key -> (value, created_at)
+        self._unwritten = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    def key(self, **params):
+        """Stable key for the given (already normalized) parameters."""
+        payload = json.dumps({'model_version': self.model_version, 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Cached value for key, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if key in self._unwritten:
+                self.hits += 1
+                return self._unwritten[key][0]
+
+            value = self._disk_get(key)
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, value)
+                return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            if self._disk() is None:
+                return
+            self._unwritten[key] = (value, time.time())
+            if len(self._unwritten) >= self.write_batch or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """Writes the pending entries to disk and evicts the expired and surplus ones."""
+        with self._lock:
+            self._flush()
+
+    def clear(self):
+        """Drops every entry, in memory and on disk, and resets the counters."""
+        with self._lock:
+            self._memory.clear()
+            self._unwritten.clear()
+            self.hits = self.disk_hits = self.misses = 0
+            connection = self._disk()
+            if connection is not None:
+                with connection:
+                    connection.execute("DELETE FROM results")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._memory),
+            'max_entries': self.max_entries,
+            'unwritten': len(self._unwritten),
+            'path': self.path,
+        }
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk(self):
+        if not self.path:
+            return None
+        # SQLite connections must not cross a fork, so each process opens its own. The
+        # parent writes its own pending entries; a child flushes its own on exit (this
+        # also covers pool and job workers, which skip atexit)
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(results)")]
+            if 'created_at' not in columns:
+                # Files from before eviction: their entries count as the oldest
+                self._connection.execute("ALTER TABLE results ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+            self._connection.commit()
+            self._connection_pid = os.getpid()
+            self._unwritten = {}
+            util.Finalize(self, self.flush, exitpriority=10)
+        return self._connection
+
+    def _disk_get(self, key):
+        connection = self._disk()
+        if connection is None:
+            return None
+        row = connection.execute(
+            "SELECT value FROM results WHERE key = ? AND created_at > ?", (key, self._oldest())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _flush(self):
+        connection = self._disk()
+        self._last_flush = time.monotonic()
+        if connection is None or not self._unwritten:
+            return
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), created_at) for key, (value, created_at) in self._unwritten.items()]
+            )
+            connection.execute("DELETE FROM results WHERE created_at <= ?", (self._oldest(),))
+            surplus = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_disk_entries
+            if surplus > 0:
+                connection.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY created_at LIMIT ?)", (surplus,)
+                )
+        self._unwritten.clear()
+
+    def _oldest(self):
+        """created_at at or below which an entry has expired."""
+        return time.time() - self.max_age if self.max_age else float('-inf')
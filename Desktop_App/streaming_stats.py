@@ -0,0 +1,176 @@
+"""
+Constant-memory statistics for simulation outputs.
+
+The models used to append every observation to a list just to average it at the end.
+These accumulators keep a fixed amount of state however many entities are simulated:
+
+- RunningStats: count, mean, variance (Welford), min and max;
+- P2Quantile: streaming quantile estimate (Jain & Chlamtac's P-squared algorithm);
+- WaitStatistics: RunningStats plus p50/p95/p99, the usual summary of a wait;
+- TimeWeightedAverage: average of a piecewise-constant level such as a queue length.
+"""
+import math
+
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def variance(self):
+        """Sample variance (0 until there are two observations)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    """Estimates the p-quantile of a stream with five markers and no stored samples."""
+
+    def __init__(self, p):
+        self.p = p
+        self._initial = []
+        self._heights = None
+
+    def add(self, value):
+        if self._heights is None:
+            self._initial.append(value)
+            if len(self._initial) == 5:
+                p = self.p
+                self._heights = sorted(self._initial)
+                self._positions = [0, 1, 2, 3, 4]
+                self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+                self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+            return
+
+        q, n = self._heights, self._positions
+        if value < q[0]:
+            q[0] = value
+            cell = 0
+        elif value >= q[4]:
+            q[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= q[cell + 1]:
+                cell += 1
+
+        for i in range(cell + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in range(1, 4):
+            offset = self._desired[i] - n[i]
+            if (offset >= 1 and n[i + 1] - n[i] > 1) or (offset <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if offset > 0 else -1
+                candidate = self._parabolic(i, step)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                n[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self):
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return math.nan
+        # Fewer than five observations: exact (nearest-rank) quantile
+        ordered = sorted(self._initial)
+        return ordered[min(len(ordered) - 1, int(self.p * len(ordered)))]
+
+
+class WaitStatistics:
+    """Mean, spread, extremes and p50/p95/p99 of a stream of waiting times."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.running = RunningStats()
+        self.quantiles = {p: P2Quantile(p) for p in self.QUANTILES}
+
+    def add(self, value):
+        self.running.add(value)
+        for estimator in self.quantiles.values():
+            estimator.add(value)
+
+    @property
+    def count(self):
+        return self.running.count
+
+    @property
+    def mean(self):
+        return self.running.mean
+
+    def quantile(self, p):
+        return self.quantiles[p].value
+
+    def summary(self):
+        if self.running.count == 0:
+            return {'count': 0, 'mean': 0.0, 'stdev': 0.0, 'min': 0.0, 'max': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+        # Independent P2 estimates can cross on short streams; report them in order
+        p50 = self.quantile(0.5)
+        p95 = max(p50, self.quantile(0.95))
+        p99 = max(p95, self.quantile(0.99))
+        return {
+            'count': self.running.count,
+            'mean': self.running.mean,
+            'stdev': self.running.stdev,
+            'min': self.running.min,
+            'max': self.running.max,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+        }
+
+
+class TimeWeightedAverage:
+    """Time average of a level that changes at discrete instants (queue length, busy machines)."""
+
+    def __init__(self, start_time=0.0, level=0.0):
+        self.start_time = start_time
+        self._last_time = start_time
+        self._level = level
+        self._area = 0.0
+        self.max = level
+
+    def update(self, time, level):
+        """Record that the level changed to level at time."""
+        self._area += self._level * (time - self._last_time)
+        self._last_time = time
+        self._level = level
+        if level > self.max:
+            self.max = level
+
+    def mean(self, time):
+        """Average level over [start_time, time]."""
+        elapsed = time - self.start_time
+        if elapsed <= 0:
+            return self._level
+        return (self._area + self._level * (time - self._last_time)) / elapsed
@@ -1,9 +1,11 @@
 import simpy
 import random
 import logging
+from streaming_stats import TimeWeightedAverage, WaitStatistics
 
-# Metrics
-waiting_times = []
+# Metrics (running statistics, constant memory however many vehicles arrive)
+waiting_times = WaitStatistics()
+queue_length = TimeWeightedAverage()
 charging_point_busy_time = 0
 
 def vehicle(env, name, charging_points):
@@ -13,9 +15,11 @@ def vehicle(env, name, charging_points):
 
     # Request a charging point
     with charging_points.request() as request:
+        queue_length.update(env.now, len(charging_points.queue))
         yield request
         wait_time = env.now - arrival_time
-        waiting_times.append(wait_time)
+        waiting_times.add(wait_time)
+        queue_length.update(env.now, len(charging_points.queue))
         logging.info(f"{name} starts charging at {env.now:.2f} minutes after waiting {wait_time:.2f} minutes.")
 
         # Charging time
@@ -34,10 +38,11 @@ def vehicle_generator(env, charging_points):
 
 def run_charging_station_simulation():
     """Runs the EV charging station simulation."""
-    global waiting_times, charging_point_busy_time
+    global waiting_times, queue_length, charging_point_busy_time
 
     # Reset metrics
-    waiting_times = []
+    waiting_times = WaitStatistics()
+    queue_length = TimeWeightedAverage()
     charging_point_busy_time = 0
 
     # Initialize environment and resources
@@ -51,12 +56,15 @@ def run_charging_station_simulation():
     env.run(until=OPERATING_HOURS * 60)
 
     # Calculate performance metrics
-    avg_waiting_time = sum(waiting_times) / len(waiting_times) if waiting_times else 0
+    avg_waiting_time = waiting_times.mean
     charging_point_utilization = (charging_point_busy_time / (NUM_CHARGING_POINTS * OPERATING_HOURS * 60)) * 100
+    wait_summary = waiting_times.summary()
 
     # Log results
     logging.info("\nSimulation Results:")
     logging.info(f"Average waiting time: {avg_waiting_time:.2f} minutes")
+    logging.info(f"Waiting time p50/p95/p99: {wait_summary['p50']:.2f}/{wait_summary['p95']:.2f}/{wait_summary['p99']:.2f} minutes")
+    logging.info(f"Average queue length: {queue_length.mean(env.now):.2f} vehicles")
     logging.info(f"Charging point utilization: {charging_point_utilization:.2f}%")
 
 def what_if_analysis():
@@ -82,7 +90,8 @@ def what_if_analysis():
         run_charging_station_simulation()
 
         # Collect results
-        avg_waiting_time = sum(waiting_times) / len(waiting_times) if waiting_times else 0
+        avg_waiting_time = waiting_times.mean
+        wait_summary = waiting_times.summary()
         utilization = (charging_point_busy_time / (NUM_CHARGING_POINTS * OPERATING_HOURS * 60)) * 100
 
         results.append({
@@ -91,6 +100,9 @@ def what_if_analysis():
             "charging_time": CHARGING_TIME,
             "hours": OPERATING_HOURS,
             "avg_waiting_time": avg_waiting_time,
+            "p50_waiting_time": wait_summary["p50"],
+            "p95_waiting_time": wait_summary["p95"],
+            "p99_waiting_time": wait_summary["p99"],
             "utilization": utilization,
         })
 
@@ -1,70 +1,559 @@
-from flask import Flask, render_template, request, jsonify
-import re
-import subprocess
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context, url_for
+import simulation_program
+from job_runner import JobCancelled, JobFailed, JobRunner, JobTimeout, QueueFull
+from job_store import JobStore, UNFINISHED
+from metrics import CONTENT_TYPE, Registry
+from request_cache import SingleFlight, TTLCache
 
 app = Flask(__name__)
 
-# Define regex patterns to extract the required information
-pattern = re.compile(r'Testing machine_capacity=(\d+), processing_time=\((\d+\.\d+), (\d+\.\d+)\), interval=\((\d+\.\d+), (\d+\.\d+)\)\nResults: Average Waiting Time=(\d+\.\d+) minutes, Machine Utilization=(\d+\.\d+)%')
-best_config_pattern = re.compile(r'Best Configuration: machine_capacity=(\d+), num_parts=(\d+), inter_arrival_time=\((\d+\.\d+), (\d+\.\d+)\), processing_time=\((\d+\.\d+), (\d+\.\d+)\)\nBest Results: Average Waiting Time=(\d+\.\d+) minutes, Machine Utilization=(\d+\.\d+)%')
+# Every submitted sweep, and every synchronous one bigger than INLINE_SWEEP_PARTS,
+# runs in a process of its own: at most JOB_WORKERS at a time with JOB_QUEUE_LIMIT
+# more waiting, each for at most JOB_TIMEOUT seconds (0 for no limit). Submitted
+# jobs' state and results live in JOB_STORE (SQLite), which outlasts the app
+JOB_STORE = JobStore(os.environ.get('JOB_STORE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jobs.sqlite3')))
+# Workers share simulation results through a file next to the job store
+simulation_program.use_cache_file(os.path.join(os.path.dirname(JOB_STORE.path), '.simulation_cache.sqlite3'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', 16))
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 1800))
+# Workers import this module to find their function; the forkserver does so once for all
+RUNNER = JobRunner(JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_TIMEOUT or None, preload=[__name__])
+FORM_FIELDS = ('random_seed', 'num_parts', 'machine_capacities', 'processing_times', 'initial_inter_arrival_range')
+# Finished sweeps are served again for RESULT_TTL seconds, from memory for
+# /run_simulation and by reusing the job for /jobs; identical sweeps in flight are
+# coalesced onto one computation
+RESULT_TTL = int(os.environ.get('RESULT_TTL', 600))
+SWEEP_CACHE = TTLCache(RESULT_TTL)
+SWEEPS = SingleFlight()
+# Synchronous sweeps of at most INLINE_SWEEP_PARTS parts times cells run in the request
+# thread, since starting a worker would take longer than the sweep. They run one at a
+# time, as the GIL would have them anyway, so their cache statistics are their own
+INLINE_SWEEP_PARTS = int(os.environ.get('INLINE_SWEEP_PARTS', 500))
+_inline_lock = threading.Lock()
+_job_lock = threading.Lock()
+_resumed = False
+
+# Operational metrics, served in the Prometheus text format on /metrics. Sweeps run
+# in worker processes, which report their statistics back with their result
+METRICS = Registry()
+REQUESTS = METRICS.counter('http_requests_total', "HTTP requests by route, method and status", ('route', 'method', 'status'))
+REQUEST_LATENCY = METRICS.histogram('http_request_duration_seconds', "HTTP request latency by route and method", ('route', 'method'))
+SWEEPS_FINISHED = METRICS.counter('simulation_sweeps_total', "Sweeps that ended, by kind (sync or job) and outcome", ('kind', 'outcome'))
+SWEEP_DURATION = METRICS.histogram('simulation_sweep_duration_seconds', "Worker wall time of completed sweeps", ('kind',))
+SIMULATIONS = METRICS.counter('simulation_runs_total', "Runs simulated by completed sweeps (result cache hits excluded)")
+EVENTS = METRICS.counter('simulation_events_total', "Events simulated by completed sweeps, an arrival and a departure per part")
+SIMULATION_SECONDS = METRICS.counter('simulation_seconds_total', "Worker wall time of completed sweeps; rate of events over rate of this is events/sec")
+EVENT_RATE = METRICS.gauge('simulation_events_per_second', "Events per second of the most recently completed sweep")
+RESULT_CACHE_LOOKUPS = METRICS.counter('simulation_result_cache_lookups_total', "Result cache lookups of completed sweeps, by result (hit or miss)", ('result',))
+METRICS.gauge('simulation_result_cache_hit_ratio', "Share of result cache lookups that hit",
+              function=lambda: hit_ratio(RESULT_CACHE_LOOKUPS.value(result='hit'), RESULT_CACHE_LOOKUPS.value(result='miss')))
+METRICS.counter('sweep_cache_hits_total', "/run_simulation requests answered from the sweep cache", function=lambda: SWEEP_CACHE.hits)
+METRICS.counter('sweep_cache_misses_total', "/run_simulation requests not in the sweep cache", function=lambda: SWEEP_CACHE.misses)
+METRICS.gauge('sweep_cache_hit_ratio', "Share of /run_simulation requests answered from the sweep cache",
+              function=lambda: hit_ratio(SWEEP_CACHE.hits, SWEEP_CACHE.misses))
+METRICS.counter('sweep_requests_coalesced_total', "/run_simulation requests that joined an identical sweep in flight", function=lambda: SWEEPS.coalesced)
+JOBS_COALESCED = METRICS.counter('jobs_coalesced_total', "Job submissions answered with an identical existing job")
+METRICS.gauge('job_queue_depth', "Sweeps waiting for a worker", function=lambda: RUNNER.queued)
+METRICS.gauge('job_workers_busy', "Sweeps running", function=lambda: RUNNER.running)
+METRICS.gauge('job_workers_max', "Most sweeps that run at once", function=lambda: RUNNER.max_workers)
+METRICS.gauge('job_worker_utilization', "Share of worker slots in use", function=lambda: RUNNER.running / RUNNER.max_workers)
+METRICS.counter('job_worker_busy_seconds_total', "Wall time worker slots spent on finished sweeps", function=lambda: RUNNER.busy_seconds)
+METRICS.counter('jobs_rejected_total', "Sweeps turned away because the queue was full", function=lambda: RUNNER.rejected)
+
+# How often an event stream looks for new rows, and the longest it stays silent
+STREAM_POLL_INTERVAL = 0.25
+STREAM_KEEPALIVE = 15
+
+# Result columns rows can be sorted by, the page sizes clients get (by default and at
+# most) and how many stored rows an NDJSON export reads at a time
+SORT_FIELDS = ('machine_capacity', 'average_waiting_time', 'machine_utilization')
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH = 1000
+
+def format_range(value):
+    """Renders a (low, high) tuple the way the results tables display it."""
+    return f"({value[0]}, {value[1]})"
+
+def result_to_row(result, num_parts, initial_inter_arrival_range):
+    """One all_results row of the JSON document index.html renders."""
+    return {
+        'machine_capacity': result.machine_capacity,
+        'processing_time': format_range(result.processing_time),
+        'interval': format_range(result.interval),
+        'num_parts': num_parts,
+        'inter_arrival_time': initial_inter_arrival_range,
+        'average_waiting_time': round(result.avg_waiting_time, 2),
+        'machine_utilization': round(result.machine_utilization, 2)
+    }
+
+def best_to_json(best, num_parts):
+    """The best_configuration and best_results entries for a best SimulationResult (or None)."""
+    if best is None:
+        return {'best_configuration': None, 'best_results': None}
+    return {
+        'best_configuration': {
+            'machine_capacity': best.machine_capacity,
+            'num_parts': num_parts,
+            'inter_arrival_time': format_range(best.interval),
+            'processing_time': format_range(best.processing_time)
+        },
+        'best_results': {
+            'average_waiting_time': round(best.avg_waiting_time, 2),
+            'machine_utilization': round(best.machine_utilization, 2)
+        }
+    }
+
+def search_to_json(search, num_parts, initial_inter_arrival_range):
+    """Converts a SearchResult into the JSON document index.html renders."""
+    return {
+        'all_results': [
+            result_to_row(result, num_parts, initial_inter_arrival_range)
+            for result in search.results
+        ],
+        **best_to_json(search.best, num_parts)
+    }
+
+def parse_form(form):
+    """find_best_configuration arguments from the submitted form (KeyError/ValueError if invalid)."""
+    return simulation_program.parse_parameters(*(form[name] for name in FORM_FIELDS))
+
+def sweep_key(params):
+    """Key of a sweep: its parsed parameters plus the model version, so '1-10' and '1.0-10' match."""
+    return simulation_program.RESULT_CACHE.key(kind='sweep', **params)
+
+def cacheable(response, max_age=None):
+    """
+    Adds an ETag (answering a matching If-None-Match with 304) and Cache-Control:
+    public for max_age seconds, or revalidate every time if max_age is None.
+    """
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max(int(max_age), 0)
+    response.add_etag()
+    return response.make_conditional(request)
+
+def busy(error):
+    """503 response for a QueueFull error, telling the client when to retry."""
+    return jsonify({'error': str(error)}), 503, {'Retry-After': str(error.retry_after)}
+
+def hit_ratio(hits, misses):
+    return hits / (hits + misses) if hits + misses else 0.0
+
+def timed_sweep(params, on_progress=None):
+    """find_best_configuration for params, plus the statistics /metrics reports about it."""
+    cache_before = simulation_program.cache_stats()
+    start = time.perf_counter()
+    search = simulation_program.find_best_configuration(
+        params['random_seed'], params['num_parts'], params['processing_times'],
+        params['machine_capacities'], params['initial_inter_arrival_range'], on_progress=on_progress
+    )
+    seconds = time.perf_counter() - start
+    # Written out now rather than when the worker exits, for the sweeps that follow
+    simulation_program.RESULT_CACHE.flush()
+    cache = simulation_program.cache_stats()
+    hits = cache['hits'] - cache_before['hits']
+    simulated = search.simulations - hits
+    return search, {
+        'seconds': seconds,
+        'simulations': simulated,
+        'events': 2 * params['num_parts'] * simulated,
+        'cache_hits': hits,
+        'cache_misses': cache['misses'] - cache_before['misses'],
+    }
+
+def record_sweep(kind, future):
+    """Adds a finished sweep (its future's result carries 'stats') to the metrics."""
+    error = future.exception()
+    if error is None:
+        outcome = 'done'
+    elif isinstance(error, JobCancelled):
+        outcome = 'cancelled'
+    elif isinstance(error, JobTimeout):
+        outcome = 'timeout'
+    else:
+        outcome = 'failed'
+    SWEEPS_FINISHED.inc(kind=kind, outcome=outcome)
+    if error is not None or future.result() is None:
+        return
+    stats = future.result()['stats']
+    SWEEP_DURATION.observe(stats['seconds'], kind=kind)
+    SIMULATIONS.inc(stats['simulations'])
+    EVENTS.inc(stats['events'])
+    SIMULATION_SECONDS.inc(stats['seconds'])
+    if stats['seconds'] > 0:
+        EVENT_RATE.set(stats['events'] / stats['seconds'])
+    RESULT_CACHE_LOOKUPS.inc(stats['cache_hits'], result='hit')
+    RESULT_CACHE_LOOKUPS.inc(stats['cache_misses'], result='miss')
+
+def run_sweep(params, initial_inter_arrival_range):
+    """The /run_simulation document for params, and its statistics; runs in a worker process."""
+    search, stats = timed_sweep(params)
+    return {'body': search_to_json(search, params['num_parts'], initial_inter_arrival_range), 'stats': stats}
+
+def run_inline_sweep(params, initial_inter_arrival_range):
+    """run_sweep in the calling thread, recorded like a worker's; raises JobFailed if the sweep fails."""
+    future = Future()
+    with _inline_lock:
+        try:
+            future.set_result(run_sweep(params, initial_inter_arrival_range))
+        except Exception as e:
+            future.set_exception(JobFailed(f"{type(e).__name__}: {e}"))
+    record_sweep('sync', future)
+    return future.result()['body']
+
+def run_job(job_id):
+    """
+    Runs a stored job to completion in a worker process, recording progress as it
+    goes, and returns the sweep's statistics (None if the job was not runnable).
+    """
+    job = JOB_STORE.get(job_id)
+    if job is None or job['status'] not in UNFINISHED:
+        return None
+    form = job['params']
+    JOB_STORE.start(job_id)
+    try:
+        params = parse_form(form)
+
+        def on_progress(results, best, done, total):
+            rows = [
+                result_to_row(result, params['num_parts'], form['initial_inter_arrival_range'])
+                for result in results if result.status == 'simulated'
+            ]
+            JOB_STORE.record_progress(job_id, rows, best_to_json(best, params['num_parts']), done, total)
+
+        _, stats = timed_sweep(params, on_progress)
+    except Exception as e:
+        JOB_STORE.fail(job_id, f"{type(e).__name__}: {e}")
+        raise
+    JOB_STORE.finish(job_id)
+    return {'stats': stats}
+
+def submit_job(job_id, force=False):
+    """Hands a stored job to RUNNER (QueueFull unless force)."""
+    future = RUNNER.submit(job_id, run_job, (job_id,), force=force)
+    future.add_done_callback(lambda future: record_outcome(job_id, future))
+    future.add_done_callback(lambda future: record_sweep('job', future))
+
+def record_outcome(job_id, future):
+    """Records how a job ended when its worker could not: killed, timed out or crashed."""
+    error = future.exception()
+    if error is None:
+        return
+    if isinstance(error, JobCancelled):
+        JOB_STORE.cancel(job_id)
+        return
+    job = JOB_STORE.get(job_id)
+    if job is not None and job['status'] in UNFINISHED:
+        JOB_STORE.fail(job_id, str(error))
+
+def resume_jobs():
+    """Requeues the jobs a previous run of the app left queued or running (once per process)."""
+    global _resumed
+    with _job_lock:
+        if _resumed:
+            return
+        _resumed = True
+        for job_id in JOB_STORE.unfinished():
+            if job_id not in RUNNER:
+                JOB_STORE.requeue(job_id)
+                submit_job(job_id, force=True)
+
+def parse_page(args):
+    """(offset, limit, sort, descending) from offset/limit/sort/order arguments; ValueError if invalid."""
+    offset = int(args.get('offset', 0))
+    limit = int(args.get('limit', PAGE_SIZE))
+    sort = args.get('sort') or None
+    order = args.get('order', 'asc')
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}")
+    if sort is not None and sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_FIELDS)}")
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    return offset, limit, sort, order == 'desc'
+
+def page_results(body, offset, limit, sort, descending):
+    """A /run_simulation document with one page of all_results, plus total_results."""
+    rows = body['all_results']
+    if sort is not None:
+        # sorted is stable, so ties stay in production order
+        rows = sorted(rows, key=lambda row: row[sort], reverse=descending)
+    return {**body, 'all_results': rows[offset:offset + limit], 'total_results': len(body['all_results'])}
+
+def ndjson_rows(job_id, sort=None, descending=False):
+    """A job's stored rows as newline-delimited JSON, EXPORT_BATCH rows per chunk."""
+    offset = 0
+    while True:
+        rows = JOB_STORE.rows(job_id, offset, EXPORT_BATCH, sort, descending)
+        if rows:
+            yield ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+        if len(rows) < EXPORT_BATCH:
+            return
+        offset += len(rows)
+
+def gzipped(chunks):
+    """Compresses a stream of byte chunks into one gzip stream as it goes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def job_status(job):
+    """Status, progress and best configuration of a job, without its rows."""
+    best = job['best'] or {'best_configuration': None, 'best_results': None}
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'progress': {
+            'done': job['done'],
+            'total': job['total'],
+            'fraction': job['done'] / job['total'] if job['total'] else (1.0 if job['status'] == 'done' else 0.0),
+        },
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+        'row_count': JOB_STORE.count_rows(job['job_id']),
+        **best
+    }
+
+def job_to_json(job):
+    """Status document of GET /jobs/<id>: status, progress and the results so far."""
+    return {**job_status(job), 'all_results': JOB_STORE.rows(job['job_id'])}
+
+def sse(event, data, event_id=None):
+    """One server-sent event carrying data as JSON."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+def job_events(job_id, sent=0, include_rows=True):
+    """
+    Event stream of a job: a 'row' event per result row (its id is the row count so
+    far), a 'progress' event whenever the progress or best configuration changes, and
+    a final 'done', 'failed' or 'cancelled' event, after which the stream ends.
+    Without include_rows only the status events are sent; their row_count tells
+    clients that page through the results when there is more to fetch.
+    """
+    last_update = None
+    last_event = time.monotonic()
+    while True:
+        # Read the status first so that rows recorded before a final status are all sent
+        job = JOB_STORE.get(job_id)
+        rows = JOB_STORE.rows(job_id, offset=sent) if include_rows else []
+        for row in rows:
+            sent += 1
+            yield sse('row', row, sent)
+        if job['updated_at'] != last_update:
+            last_update = job['updated_at']
+            status = job_status(job)
+            yield sse('progress' if job['status'] in UNFINISHED else job['status'], status)
+            if job['status'] not in UNFINISHED:
+                return
+            last_event = time.monotonic()
+        elif rows:
+            last_event = time.monotonic()
+        elif time.monotonic() - last_event >= STREAM_KEEPALIVE:
+            # A comment line keeps proxies from closing an idle connection
+            yield ": keepalive\n\n"
+            last_event = time.monotonic()
+        time.sleep(STREAM_POLL_INTERVAL)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def resume_on_first_request():
+    # However the app is served (flask run, a WSGI server, app.run), the process that
+    # answers requests picks up the jobs left over; reloader parents and job workers
+    # import this module too but never serve a request
+    if not _resumed:
+        resume_jobs()
+
+@app.after_request
+def record_request(response):
+    # Routes are labelled by their rule, so /jobs/<job_id> is one series for every job
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    REQUEST_LATENCY.observe(time.perf_counter() - g.request_started, route=route, method=request.method)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
     return render_template('index.html')
 
-@app.route('/run_simulation', methods=['POST'])
+@app.route('/run_simulation', methods=['GET', 'POST'])
 def run_simulation():
-    # Get parameters from the form
-    random_seed = request.form['random_seed']
-    num_parts = request.form['num_parts']
-    machine_capacities = request.form['machine_capacities']
-    processing_times = request.form['processing_times']
-    initial_inter_arrival_range = request.form['initial_inter_arrival_range']
-
-    # Run the simulation program with the provided parameters and capture the output
-    result = subprocess.run(
-        ['python', 'simulation_program.py', random_seed, num_parts, machine_capacities, processing_times, initial_inter_arrival_range],
-        capture_output=True,
-        text=True
-    )
+    # Get parameters from the form (or the query string, which browsers can cache)
+    try:
+        params = parse_form(request.values)
+        # offset, limit, sort or order ask for one page of all_results instead of all of them
+        page = parse_page(request.values) if any(name in request.values for name in ('offset', 'limit', 'sort', 'order')) else None
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f"Invalid simulation parameters: {e}"}), 400
+    initial_inter_arrival_range = request.values['initial_inter_arrival_range']
+    key = sweep_key(params)
 
-    # Extract data from the output
-    content = result.stdout
-    best_configuration = None
-    best_results = None
-    all_results = []
-
-    matches = pattern.findall(content)
-    for match in matches:
-        all_results.append({
-            'machine_capacity': match[0],
-            'processing_time': f"({match[1]}, {match[2]})",
-            'interval': f"({match[3]}, {match[4]})",
-            'num_parts': num_parts,
-            'inter_arrival_time': initial_inter_arrival_range,
-            'average_waiting_time': match[5],
-            'machine_utilization': match[6]
-        })
-
-    best_match = best_config_pattern.search(content)
-    if best_match:
-        best_configuration = {
-            'machine_capacity': best_match[1],
-            'num_parts': best_match[2],
-            'inter_arrival_time': f"({best_match[3]}, {best_match[4]})",
-            'processing_time': f"({best_match[5]}, {best_match[6]})"
-        }
-        best_results = {
-            'average_waiting_time': best_match[7],
-            'machine_utilization': best_match[8]
-        }
+    def sweep():
+        cells = len(params['machine_capacities']) * len(params['processing_times'])
+        if params['num_parts'] * cells <= INLINE_SWEEP_PARTS:
+            body = run_inline_sweep(params, initial_inter_arrival_range)
+        else:
+            # Run the sweep in a worker process and wait for it
+            future = RUNNER.submit(f"sweep-{key}", run_sweep, (params, initial_inter_arrival_range))
+            future.add_done_callback(lambda future: record_sweep('sync', future))
+            body = future.result()['body']
+        SWEEP_CACHE.put(key, body)
+        return body
+
+    cached = SWEEP_CACHE.get(key)
+    if cached is None:
+        try:
+            body, max_age = SWEEPS.do(key, sweep), RESULT_TTL
+        except QueueFull as e:
+            return busy(e)
+        except JobTimeout as e:
+            return jsonify({'error': f"Simulation timed out: {e}"}), 504
+        except (JobFailed, JobCancelled) as e:
+            return jsonify({'error': f"Simulation failed: {e}"}), 500
+    else:
+        body, max_age = cached
+    if page is not None:
+        body = page_results(body, *page)
 
     # Return the results as JSON
+    return cacheable(jsonify(body), max_age)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Queues a sweep and returns its id at once (202); poll GET /jobs/<id> or follow its
+    events. An identical sweep that is in flight or finished within RESULT_TTL is
+    returned instead of starting another (coalesced is then true).
+    """
+    try:
+        form = {name: request.form[name] for name in FORM_FIELDS}
+        key = sweep_key(parse_form(form))
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f"Invalid simulation parameters: {e}"}), 400
+
+    with _job_lock:
+        # A queued or running job that RUNNER does not know was orphaned by a dead process
+        job_id = JOB_STORE.find(key, RESULT_TTL, owned=RUNNER.__contains__)
+        coalesced = job_id is not None
+        if coalesced:
+            JOBS_COALESCED.inc()
+        else:
+            job_id = JOB_STORE.create(form, key)
+            try:
+                submit_job(job_id)
+            except QueueFull as e:
+                JOB_STORE.delete(job_id)
+                return busy(e)
+    status_url = url_for('get_job', job_id=job_id)
     return jsonify({
-        'all_results': all_results,
-        'best_configuration': best_configuration,
-        'best_results': best_results
-    })
+        'job_id': job_id, 'status': JOB_STORE.get(job_id)['status'], 'coalesced': coalesced,
+        'status_url': status_url, 'events_url': url_for('stream_job', job_id=job_id)
+    }), 202, {'Location': status_url}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = JOB_STORE.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job: {job_id}"}), 404
+    # A finished job never changes again
+    return cacheable(jsonify(job_to_json(job)), RESULT_TTL if job['status'] == 'done' else None)
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """One page of a job's rows: offset, limit (at most MAX_PAGE_SIZE), sort and order=asc|desc."""
+    job = JOB_STORE.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job: {job_id}"}), 404
+    try:
+        offset, limit, sort, descending = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': f"Invalid page: {e}"}), 400
+    return cacheable(jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'total': JOB_STORE.count_rows(job_id),
+        'offset': offset,
+        'limit': limit,
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'rows': JOB_STORE.rows(job_id, offset, limit, sort, descending),
+    }), RESULT_TTL if job['status'] == 'done' else None)
+
+@app.route('/jobs/<job_id>/results.ndjson', methods=['GET'])
+def export_job_results(job_id):
+    """
+    Streams every row of a job (so far) as newline-delimited JSON, in the order given
+    by sort and order, gzip-compressed when the client accepts it.
+    """
+    if JOB_STORE.get(job_id) is None:
+        return jsonify({'error': f"Unknown job: {job_id}"}), 404
+    try:
+        _, _, sort, descending = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': f"Invalid order: {e}"}), 400
+    chunks = ndjson_rows(job_id, sort, descending)
+    headers = {'Content-Disposition': f'attachment; filename="{job_id}.ndjson"', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        chunks = gzipped(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype='application/x-ndjson', headers=headers)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancels a queued job, or kills the worker process of a running one."""
+    job = JOB_STORE.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job: {job_id}"}), 404
+    if job['status'] not in UNFINISHED:
+        return jsonify({'error': f"Job {job_id} has already finished ({job['status']})"}), 409
+    # Stop the worker before recording the cancel, so it cannot overwrite the status
+    RUNNER.cancel(job_id)
+    JOB_STORE.cancel(job_id)
+    return jsonify(job_status(JOB_STORE.get(job_id)))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    """Streams a job's rows and progress as server-sent events (see job_events); rows=0 omits the rows."""
+    if JOB_STORE.get(job_id) is None:
+        return jsonify({'error': f"Unknown job: {job_id}"}), 404
+    # EventSource reconnects with the id of the last row it received
+    try:
+        sent = max(int(request.headers.get('Last-Event-ID', 0)), 0)
+    except ValueError:
+        sent = 0
+    return Response(
+        stream_with_context(job_events(job_id, sent, request.args.get('rows') != '0')),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 if __name__ == '__main__':
+    # With the debug reloader this module runs twice; the serving child resumes jobs at
+    # once rather than on its first request
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_jobs()
     app.run(debug=True)
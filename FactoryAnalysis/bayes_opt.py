@@ -0,0 +1,113 @@
+"""
+NumPy-only Bayesian optimization, used by simulation_program.bayesian_search.
+
+The objective lives on the unit cube [0, 1]^d; callers map points to configurations
+(and may snap them, e.g. to integer capacities). The surrogate is a Gaussian process
+with a Matern 5/2 kernel whose length scale and noise level are picked by marginal
+likelihood from a small grid, which is robust with the few dozen points a simulation
+budget allows. New points maximize expected improvement over random candidates;
+batches are filled with the kriging believer heuristic (each pick is added to the
+data at its predicted mean before the next), so a batch can be evaluated in parallel.
+"""
+import math
+import numpy as np
+
+LENGTH_SCALES = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6)
+NOISE_LEVELS = (1e-6, 1e-3, 1e-2, 1e-1)
+
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def matern52(a, b, length_scale):
+    """Matern 5/2 covariance between the rows of a and b (unit variance)."""
+    distance = np.sqrt(np.maximum(((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1), 0)) / length_scale
+    scaled = math.sqrt(5) * distance
+    return (1 + scaled + scaled ** 2 / 3) * np.exp(-scaled)
+
+def normal_cdf(z):
+    return 0.5 * (1 + _erf(np.asarray(z, dtype=float) / math.sqrt(2)).astype(float))
+
+def normal_pdf(z):
+    return np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+
+
+class GaussianProcess:
+    """GP regression on standardized targets, hyperparameters by marginal likelihood."""
+
+    def fit(self, X, y):
+        self.X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.y_mean = y.mean()
+        self.y_scale = y.std() or 1.0
+        target = (y - self.y_mean) / self.y_scale
+
+        best = None
+        for length_scale in LENGTH_SCALES:
+            covariance = matern52(self.X, self.X, length_scale)
+            for noise in NOISE_LEVELS:
+                try:
+                    cholesky = np.linalg.cholesky(covariance + noise * np.eye(len(target)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, target))
+                log_likelihood = -0.5 * target @ alpha - np.log(np.diag(cholesky)).sum()
+                if best is None or log_likelihood > best[0]:
+                    best = (log_likelihood, length_scale, noise, cholesky, alpha)
+
+        _, self.length_scale, self.noise, self._cholesky, self._alpha = best
+        return self
+
+    def predict(self, X):
+        """Posterior mean and standard deviation at the rows of X, in target units."""
+        cross = matern52(np.asarray(X, dtype=float), self.X, self.length_scale)
+        mean = cross @ self._alpha
+        solved = np.linalg.solve(self._cholesky, cross.T)
+        variance = np.maximum(1 - (solved ** 2).sum(axis=0), 1e-12)
+        return self.y_mean + self.y_scale * mean, self.y_scale * np.sqrt(variance)
+
+
+def expected_improvement(mean, std, best, xi=0.01):
+    """Expected improvement over best of a maximization objective."""
+    improvement = mean - best - xi
+    z = improvement / std
+    return improvement * normal_cdf(z) + std * normal_pdf(z)
+
+def latin_hypercube(n, dimensions, rng):
+    """n points in [0, 1]^dimensions with one point per stratum along every axis."""
+    strata = np.stack([rng.permutation(n) for _ in range(dimensions)], axis=1)
+    return (strata + rng.random((n, dimensions))) / n
+
+def propose_batch(X, y, batch_size, rng, snap=None, num_candidates=2048, xi=0.01):
+    """
+    batch_size new points for a maximization problem observed at (X, y).
+
+    snap maps candidate points onto the feasible set (e.g. rounds integer axes); points
+    already in X or in the batch are never proposed twice. Larger xi explores more.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    dimensions = X.shape[1]
+    snap = snap or (lambda points: points)
+    seen = {tuple(np.round(point, 9)) for point in X}
+    batch = []
+
+    for _ in range(batch_size):
+        gp = GaussianProcess().fit(X, y)
+        # Global random candidates plus local perturbations of the best points so far
+        top = X[np.argsort(y)[-5:]]
+        local = top[rng.integers(len(top), size=num_candidates // 2)] + rng.normal(0, 0.05, (num_candidates // 2, dimensions))
+        candidates = snap(np.clip(np.vstack([rng.random((num_candidates - len(local), dimensions)), local]), 0, 1))
+        fresh = np.array([tuple(np.round(point, 9)) not in seen for point in candidates])
+        if not fresh.any():
+            break
+        candidates = candidates[fresh]
+
+        mean, std = gp.predict(candidates)
+        choice = candidates[np.argmax(expected_improvement(mean, std, y.max(), xi))]
+        batch.append(choice)
+        seen.add(tuple(np.round(choice, 9)))
+        # Kriging believer: pretend the pick came out at its predicted mean
+        X = np.vstack([X, choice])
+        y = np.append(y, gp.predict(choice[None, :])[0])
+
+    return np.array(batch).reshape(-1, dimensions)
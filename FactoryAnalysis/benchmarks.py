@@ -0,0 +1,227 @@
+"""
+Benchmark suite for simulation_program.
+
+Times run_simulation for every backend across num_parts and machine capacities, and
+find_best_configuration across grid sizes. Every case runs in a fresh interpreter
+so its peak RSS is its own, with the result cache disabled and a fixed seed, so two
+runs on the same machine measure the same work.
+
+    python benchmarks.py --output before.json
+    python benchmarks.py --output after.json --compare before.json --threshold 0.1
+
+--compare prints the change of every case against a previous JSON file and exits
+with status 1 if any case got slower (or used more memory) by more than threshold.
+Events are counted as two per simulated part (arrival and departure), which is the
+same for every backend, so events/sec compares engines directly. Peak RSS comes from
+getrusage on Unix and from psutil (if installed) on Windows; without either it is
+reported as null and left out of the comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = {
+    'simpy': {'backend': 'simpy', 'arrival_mode': 'process'},
+    'simpy-token': {'backend': 'simpy', 'arrival_mode': 'token'},
+    'numpy': {'backend': 'numpy', 'arrival_mode': None},
+}
+PROCESSING_TIME = (4.0, 6.0)
+RANDOM_SEED = 42
+
+
+def inter_arrival_for(machine_capacity, utilization=0.9):
+    """Inter-arrival range that loads machine_capacity machines to about utilization."""
+    mean = sum(PROCESSING_TIME) / 2 / (machine_capacity * utilization)
+    return (round(mean * 0.5, 4), round(mean * 1.5, 4))
+
+def build_cases(backends, num_parts_list, capacities, grid_sizes, grid_parts):
+    cases = []
+    for backend in backends:
+        for machine_capacity in capacities:
+            for num_parts in num_parts_list:
+                cases.append({
+                    'name': f"run_simulation/{backend}/parts={num_parts}/capacity={machine_capacity}",
+                    'kind': 'run_simulation', 'backend': backend,
+                    'num_parts': num_parts, 'machine_capacity': machine_capacity,
+                })
+        for grid_size in grid_sizes:
+            cases.append({
+                'name': f"find_best_configuration/{backend}/parts={grid_parts}/grid={grid_size}",
+                'kind': 'find_best_configuration', 'backend': backend,
+                'num_parts': grid_parts, 'grid_size': grid_size,
+            })
+    return cases
+
+def run_case(case):
+    """Runs one case in this process and returns its measurements."""
+    import simulation_program
+
+    engine = BACKENDS[case['backend']]
+    if engine['arrival_mode']:
+        simulation_program.ARRIVAL_MODE = engine['arrival_mode']
+    if engine['backend'] == 'numpy':
+        # Keep the NumPy import out of the timings
+        import queue_engine
+
+    if case['kind'] == 'run_simulation':
+        start = time.perf_counter()
+        simulation_program.run_simulation(
+            RANDOM_SEED, case['num_parts'], inter_arrival_for(case['machine_capacity']), PROCESSING_TIME,
+            case['machine_capacity'], backend=engine['backend'], use_cache=False
+        )
+        wall_time = time.perf_counter() - start
+        simulations = 1
+    else:
+        # A grid_size x 1 grid: capacities 1 .. grid_size, one processing time
+        capacities = list(range(1, case['grid_size'] + 1))
+        start = time.perf_counter()
+        search = simulation_program.find_best_configuration(
+            RANDOM_SEED, case['num_parts'], [PROCESSING_TIME], capacities, (0.5, 10.0), backend=engine['backend']
+        )
+        wall_time = time.perf_counter() - start
+        simulations = search.simulations
+
+    events = 2 * case['num_parts'] * simulations
+    return dict(
+        case,
+        wall_time=wall_time,
+        simulations=simulations,
+        events=events,
+        events_per_sec=events / wall_time if wall_time > 0 else float('inf'),
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it cannot be measured."""
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        # peak_wset (peak working set) is Windows' ru_maxrss
+        return getattr(memory, 'peak_wset', memory.rss) / 1024 ** 2
+    return None
+
+def format_rss(value):
+    return f"{value:>7.1f}MB" if value is not None else f"{'n/a':>9}"
+
+def run_isolated(case, repeat, timeout):
+    """Best of repeat fresh-interpreter runs of case (lowest wall time), or an error entry."""
+    env = dict(os.environ, SIMULATION_CACHE_ENTRIES='0', SIMULATION_CACHE='')
+    best = None
+    for _ in range(repeat):
+        try:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)],
+                cwd=HERE, env=env, capture_output=True, text=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            return dict(case, error=f"timed out after {timeout}s")
+        if completed.returncode != 0:
+            return dict(case, error=completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed')
+        measurement = json.loads(completed.stdout)
+        if best is None or measurement['wall_time'] < best['wall_time']:
+            best = measurement
+    return best
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline, threshold):
+    """Prints the change of every case against baseline and returns the regressed names."""
+    previous = {entry['name']: entry for entry in baseline['results'] if 'error' not in entry}
+    regressions = []
+    print(f"{'case':<70} {'time':>10} {'change':>8} {'rss':>9} {'change':>8}")
+    for entry in results:
+        old = previous.get(entry['name'])
+        if old is None or 'error' in entry:
+            continue
+        time_change = entry['wall_time'] / old['wall_time'] - 1 if old['wall_time'] else 0.0
+        rss_change = entry['peak_rss_mb'] / old['peak_rss_mb'] - 1 if entry.get('peak_rss_mb') and old.get('peak_rss_mb') else 0.0
+        regressed = time_change > threshold or rss_change > threshold
+        if regressed:
+            regressions.append(entry['name'])
+        print(f"{entry['name']:<70} {entry['wall_time']:>9.3f}s {time_change:>+8.1%} {format_rss(entry.get('peak_rss_mb'))} {rss_change:>+8.1%}"
+              + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+def parse_list(text, convert=int):
+    return [convert(value) for value in text.split(',') if value]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark run_simulation and find_best_configuration.")
+    parser.add_argument('--backends', default='simpy,simpy-token,numpy', help=f"Comma-separated, from {', '.join(BACKENDS)}")
+    parser.add_argument('--num-parts', default='1000,10000,100000', help="e.g. 1000,10000,100000,1000000,10000000")
+    parser.add_argument('--capacities', default='1,4,16', help="Machine capacities for the run_simulation cases")
+    parser.add_argument('--grid-sizes', default='1,4,16', help="Number of capacities in the find_best_configuration cases")
+    parser.add_argument('--grid-parts', type=int, default=1000, help="num_parts of the find_best_configuration cases")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case; the fastest is kept")
+    parser.add_argument('--timeout', type=float, default=1800, help="Seconds before a single run is abandoned")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed relative slowdown before --compare fails")
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # Child process: measure one case and report on stdout
+        print(json.dumps(run_case(json.loads(args.case))))
+        sys.exit(0)
+
+    backends = parse_list(args.backends, str)
+    unknown = [backend for backend in backends if backend not in BACKENDS]
+    if unknown:
+        parser.error(f"Unknown backends: {', '.join(unknown)}")
+    cases = build_cases(backends, parse_list(args.num_parts), parse_list(args.capacities), parse_list(args.grid_sizes), args.grid_parts)
+
+    results = []
+    for case in cases:
+        result = run_isolated(case, args.repeat, args.timeout)
+        results.append(result)
+        if 'error' in result:
+            print(f"{case['name']:<70} ERROR: {result['error']}")
+        else:
+            print(f"{case['name']:<70} {result['wall_time']:>9.3f}s {result['events_per_sec']:>12,.0f} events/s {format_rss(result['peak_rss_mb'])}")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
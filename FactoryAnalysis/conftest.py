@@ -0,0 +1,5 @@
+"""Keeps the tests' job store, and the result cache file next to it, out of the tree."""
+import os
+import tempfile
+
+os.environ.setdefault('JOB_STORE', os.path.join(tempfile.mkdtemp(prefix='factory-tests-'), '.jobs.sqlite3'))
@@ -1,124 +1,163 @@
-from nicegui import ui
-import subprocess
-import re
-import threading
+import itertools
 import logging
+import os
+import queue
 import signal
 import sys
+import time
+from operator import itemgetter
+
+import simulation_program
+from desktop_sweep import run_sweep
+from downsampling import lttb
+from job_runner import JobCancelled, JobRunner, in_job_process
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Define regex patterns to extract the required information
-pattern = re.compile(r'Testing machine_capacity=(\d+), processing_time=\((\d+\.\d+), (\d+\.\d+)\), interval=\((\d+\.\d+), (\d+\.\d+)\)\nResults: Average Waiting Time=(\d+\.\d+) minutes, Machine Utilization=(\d+\.\d+)%')
-best_config_pattern = re.compile(r'Best Configuration: machine_capacity=(\d+), num_parts=(\d+), inter_arrival_time=\((\d+\.\d+), (\d+\.\d+)\), processing_time=\((\d+\.\d+), (\d+\.\d+)\)\nBest Results: Average Waiting Time=(\d+\.\d+) minutes, Machine Utilization=(\d+\.\d+)%')
-
-def run_simulation(random_seed, num_parts, machine_capacities, processing_times, initial_inter_arrival_range):
-    logging.info('Starting simulation with parameters: %s, %s, %s, %s, %s',
-                 random_seed, num_parts, machine_capacities, processing_times, initial_inter_arrival_range)
-    
-    # Convert all parameters to strings
-    args = [
-        'python', 'simulation_program.py',
-        str(random_seed),
-        str(num_parts),
-        machine_capacities,
-        processing_times,
-        initial_inter_arrival_range
-    ]
-    
-    result = subprocess.run(args, capture_output=True, text=True)
-    
-    # Check for errors
-    if result.returncode != 0:
-        logging.error('Simulation program exited with errors:\n%s', result.stderr)
-        return [], None, None
-
-    content = result.stdout
-    best_configuration = None
-    best_results = None
-    all_results = []
-
-    # Updated regex patterns to match integers and decimals
-    number_pattern = r'([0-9]+(?:\.[0-9]+)?)'
-    pattern = re.compile(
-        r'Testing machine_capacity=(\d+), processing_time=\(' + number_pattern + r', ' + number_pattern + r'\), '
-        r'interval=\(' + number_pattern + r', ' + number_pattern + r'\)\n'
-        r'Results: Average Waiting Time=' + number_pattern + r' minutes, Machine Utilization=' + number_pattern + r'%'
-    )
-    best_config_pattern = re.compile(
-        r'Best Configuration: machine_capacity=(\d+), num_parts=(\d+), inter_arrival_time=\(' + number_pattern + r', ' + number_pattern + r'\), '
-        r'processing_time=\(' + number_pattern + r', ' + number_pattern + r'\)\n'
-        r'Best Results: Average Waiting Time=' + number_pattern + r' minutes, Machine Utilization=' + number_pattern + r'%'
-    )
-
-    matches = pattern.findall(content)
-    for match in matches:
-        all_results.append({
-            'machine_capacity': match[0],
-            'processing_time': f"({match[1]}, {match[2]})",
-            'interval': f"({match[3]}, {match[4]})",
-            'num_parts': num_parts,
-            'inter_arrival_time': initial_inter_arrival_range,
-            'average_waiting_time': match[5],
-            'machine_utilization': match[6]
-        })
-
-    best_match = best_config_pattern.search(content)
-    if best_match:
-        best_configuration = {
-            'machine_capacity': best_match[1],
-            'num_parts': best_match[2],
-            'inter_arrival_time': f"({best_match[3]}, {best_match[4]})",
-            'processing_time': f"({best_match[5]}, {best_match[6]})"
-        }
-        best_results = {
-            'average_waiting_time': best_match[7],
-            'machine_utilization': best_match[8]
-        }
-
-    logging.info('Simulation completed')
-    logging.info(best_results)
-    return all_results, best_configuration, best_results
+# One sweep at a time, in its own process, so that Cancel stops it outright. Each
+# worker starts with an empty result cache; sweeps share runs through this file
+RUNNER = JobRunner(max_workers=1, max_queued=0)
+simulation_program.use_cache_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.simulation_cache.sqlite3'))
+# How often the window picks up the rows a running sweep has sent
+POLL_INTERVAL = 0.2
+SWEEP_IDS = itertools.count(1)
+# The rows stay in this process: the All Results table is sent one page of them at a
+# time, and the chart at most CHART_POINTS points. While a sweep runs both are
+# redrawn at most every VIEW_REFRESH_INTERVAL seconds.
+PAGE_SIZE = 500
+CHART_POINTS = 2000
+VIEW_REFRESH_INTERVAL = 1.0
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
 
 def main():
-    simulation_thread = None
+    # Imported here, not at the top: sweep workers import this script too
+    from nicegui import app, ui
 
-    def on_run_button_click():
-        nonlocal simulation_thread
+    # The running sweep: its job id, future, event queue and start time
+    sweep = None
+    # Every row of the latest sweep, and when the table and chart last showed them
+    results = []
+    refreshed = 0.0
 
-        def run_simulation_thread():
-            results_section.classes(remove='hidden')
-            all_results, best_configuration, best_results = run_simulation(
+    def on_run_button_click():
+        nonlocal sweep
+        if sweep is not None:
+            logging.warning('Simulation is already running')
+            return
+        try:
+            params = simulation_program.parse_parameters(
                 random_seed.value, num_parts.value, machine_capacities.value, processing_times.value, initial_inter_arrival_range.value
             )
-            
-            if best_configuration and best_results:
-                best_configuration_data = [{'machine_capacity': best_configuration['machine_capacity'],
-                                            'num_parts': best_configuration['num_parts'],
-                                            'inter_arrival_time': best_configuration['inter_arrival_time'],
-                                            'processing_time': best_configuration['processing_time'],
-                                            'average_waiting_time': best_results['average_waiting_time'],
-                                            'machine_utilization': best_results['machine_utilization']}]
-                best_configuration_table.rows = best_configuration_data
-            else:
-                best_configuration_table.rows.append(['No configuration met the criteria.'])
-            
-            all_results_table.rows = all_results
-
-        if simulation_thread and simulation_thread.is_alive():
-            logging.warning('Simulation is already running')
+        except ValueError as e:
+            ui.notify(f"Invalid parameters: {e}", type='negative')
+            return
+        logging.info('Starting simulation with parameters: %s', params)
+
+        events = RUNNER.context.Queue()
+        job_id = str(next(SWEEP_IDS))
+        future = RUNNER.submit(job_id, run_sweep, (params, initial_inter_arrival_range.value, events))
+        sweep = {'job_id': job_id, 'future': future, 'events': events, 'started': time.monotonic()}
+        best_configuration_table.rows = []
+        results.clear()
+        refresh_view()
+        progress.value = 0
+        progress_label.text = 'Starting...'
+        results_section.classes(remove='hidden')
+        run_button.disable()
+        cancel_button.enable()
+
+    def on_cancel_button_click():
+        if sweep is not None:
+            logging.info('Cancelling simulation')
+            RUNNER.cancel(sweep['job_id'])
+
+    def show_page(pagination=None):
+        """Sends the table the page of results that pagination (default: the current one) asks for."""
+        pagination = dict(pagination or all_results_table.pagination, rowsNumber=len(results))
+        rows = results
+        if pagination.get('sortBy'):
+            rows = sorted(results, key=itemgetter(pagination['sortBy']), reverse=bool(pagination.get('descending')))
+        rows_per_page = pagination.get('rowsPerPage') or PAGE_SIZE
+        # Back to the last page there is, e.g. once a new sweep has cleared the results
+        pagination['page'] = min(pagination.get('page', 1), max(1, -(-len(rows) // rows_per_page)))
+        start = (pagination['page'] - 1) * rows_per_page
+        all_results_table.rows = rows[start:start + rows_per_page]
+        all_results_table.pagination = pagination
+
+    def show_chart():
+        """Plots wait against utilization for every result, downsampled to CHART_POINTS."""
+        points = sorted((row['machine_utilization'], row['average_waiting_time']) for row in results)
+        chart.options['series'][0]['data'] = [list(point) for point in lttb(points, CHART_POINTS)]
+        chart.options['series'][1]['data'] = [
+            [row['machine_utilization'], row['average_waiting_time']] for row in best_configuration_table.rows
+        ]
+        chart.update()
+
+    def refresh_view():
+        nonlocal refreshed
+        refreshed = time.monotonic()
+        show_page()
+        show_chart()
+
+    def poll_sweep():
+        nonlocal sweep
+        if sweep is None:
+            return
+        # Checked before draining: a worker that has exited has flushed everything it sent
+        finished = sweep['future'].done()
+        rows = []
+        while True:
+            try:
+                cell_rows, best, done, total = sweep['events'].get_nowait()
+            except queue.Empty:
+                break
+            for row in cell_rows:
+                row['id'] = len(results) + len(rows)
+                rows.append(row)
+            best_configuration_table.rows = [best] if best else []
+            elapsed = time.monotonic() - sweep['started']
+            progress.value = done / total
+            progress_label.text = f"{done}/{total} cells, ETA {format_seconds(elapsed / done * (total - done))}"
+        results.extend(rows)
+        if not finished:
+            if rows and time.monotonic() - refreshed >= VIEW_REFRESH_INTERVAL:
+                refresh_view()
+            return
+
+        refresh_view()
+        elapsed = format_seconds(time.monotonic() - sweep['started'])
+        error = sweep['future'].exception()
+        if error is None:
+            progress.value = 1
+            progress_label.text = f"Done: {len(results)} results in {elapsed}"
+            if not best_configuration_table.rows:
+                ui.notify('No configuration met the criteria.')
+        elif isinstance(error, JobCancelled):
+            progress_label.text = f"Cancelled after {elapsed}"
         else:
-            simulation_thread = threading.Thread(target=run_simulation_thread)
-            simulation_thread.start()
+            logging.error('Simulation failed: %s', error)
+            progress_label.text = 'Failed'
+            ui.notify(f"Simulation failed: {error}", type='negative')
+        logging.info('Simulation completed')
+        sweep = None
+        run_button.enable()
+        cancel_button.disable()
+
+    def stop_sweep():
+        if sweep is not None:
+            RUNNER.cancel(sweep['job_id'])
 
     def signal_handler(sig, frame):
         logging.info('Exiting program')
-        if simulation_thread and simulation_thread.is_alive():
-            simulation_thread.join()
+        stop_sweep()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
+    app.on_shutdown(stop_sweep)
 
     with ui.row().classes('h-screen').style('flex-wrap: nowrap;'):
         # Parameters section
@@ -129,12 +168,17 @@ def main():
             machine_capacities = ui.input(label='Machine Capacities', placeholder='e.g., 4,6,8', autocomplete=['4,6,8', '5,7,9']).classes('mb-4').style('border: 1px solid #ced4da; border-radius: 0.25rem; padding: 0.375rem 0.75rem;')
             processing_times = ui.input(label='Processing Times', placeholder='e.g., 4-6,5-7', autocomplete=['4-6,5-7', '3-5,6-8']).classes('mb-4').style('border: 1px solid #ced4da; border-radius: 0.25rem; padding: 0.375rem 0.75rem;')
             initial_inter_arrival_range = ui.input(label='Inter-Arrival Time Range', placeholder='e.g., 1.0-10.0', autocomplete=['1.0-10.0', '2.0-8.0']).classes('mb-4').style('border: 1px solid #ced4da; border-radius: 0.25rem; padding: 0.375rem 0.75rem;')
-            run_button = ui.button('Run').classes('mt-auto')
+            with ui.row().classes('mt-auto'):
+                run_button = ui.button('Run')
+                cancel_button = ui.button('Cancel', color='negative')
+            cancel_button.disable()
 
         # Results section
         with ui.column().classes('w-3/4 p-4'):
             results_section = ui.column()
             with results_section:
+                progress = ui.linear_progress(value=0, show_value=False)
+                progress_label = ui.label().classes('mb-4')
                 ui.label('Best Configuration').classes('text-h6 mb-2')
                 best_configuration_table = ui.table(columns=[
                     {'name': 'machine_capacity', 'label': 'Machine Capacity', 'field': 'machine_capacity', 'required': True, 'align': 'left'},
@@ -153,11 +197,28 @@ def main():
                     {'name': 'inter_arrival_time', 'label': 'Inter-Arrival Time', 'field': 'inter_arrival_time', 'sortable': True},
                     {'name': 'average_waiting_time', 'label': 'Average Waiting Time (minutes)', 'field': 'average_waiting_time', 'sortable': True},
                     {'name': 'machine_utilization', 'label': 'Machine Utilization (%)', 'field': 'machine_utilization', 'sortable': True},
-                ], rows=[], row_key='machine_capacity')
+                ], rows=[], row_key='id', pagination={'rowsPerPage': PAGE_SIZE, 'page': 1, 'rowsNumber': 0})
+                # Server-side paging: Quasar asks for every page (and sort order) it shows
+                all_results_table.props(f':rows-per-page-options="[100, {PAGE_SIZE}, 1000]" virtual-scroll').style('height: 600px')
+                all_results_table.on('request', lambda e: show_page(e.args['pagination']), ['pagination'])
+                ui.label('Waiting Time vs Utilization').classes('text-h6 mt-4 mb-2')
+                chart = ui.echart({
+                    'tooltip': {'trigger': 'item'},
+                    'xAxis': {'type': 'value', 'name': 'Machine Utilization (%)', 'scale': True},
+                    'yAxis': {'type': 'value', 'name': 'Average Waiting Time (minutes)', 'scale': True},
+                    'series': [
+                        {'type': 'scatter', 'name': 'Results', 'symbolSize': 4, 'data': []},
+                        {'type': 'scatter', 'name': 'Best', 'symbolSize': 12, 'data': []},
+                    ],
+                }).classes('w-full h-96')
 
         run_button.on('click', on_run_button_click)
+        cancel_button.on('click', on_cancel_button_click)
+        ui.timer(POLL_INTERVAL, poll_sweep)
 
     ui.run(native=True, window_size=(1500, 800), reload=True)
 
-if __name__ in {"__main__", "__mp_main__"}:
+# NiceGUI runs this script again as __mp_main__ in the processes it starts; so do
+# sweep workers, which must not build a UI of their own
+if __name__ == "__main__" or (__name__ == "__mp_main__" and not in_job_process()):
     main()
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Downsampling of chart data before it is sent to the browser or webview.
+
+lttb implements Largest-Triangle-Three-Buckets (Steinarsson, 2013): of every bucket
+of consecutive points it keeps the one that spans the largest triangle with the
+point kept before it and the average of the next bucket, so peaks, troughs and the
+overall shape survive while the point count drops to a fixed budget.
+"""
+
+
+def lttb(points, threshold):
+    """
+    Downsamples (x, y) points, sorted by x, to at most threshold of them.
+
+    The first and last points are always kept; the others are picked from
+    threshold - 2 buckets of (almost) equal size. Returns a list of the original
+    point objects, or all of them if there are no more than threshold.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    kept = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        # The third corner: the average point of the next bucket (the last point, at the end)
+        following = points[end:min(int((bucket + 2) * bucket_size) + 1, n)]
+        average_x = sum(point[0] for point in following) / len(following)
+        average_y = sum(point[1] for point in following) / len(following)
+
+        kept_x, kept_y = points[kept][0], points[kept][1]
+        dx, dy = kept_x - average_x, average_y - kept_y
+        largest = -1.0
+        for index in range(start, end):
+            # Twice the triangle's area; the constant factor does not change the winner
+            area = abs(dx * (points[index][1] - kept_y) - dy * (kept_x - points[index][0]))
+            if area > largest:
+                largest, chosen = area, index
+        sampled.append(points[chosen])
+        kept = chosen
+    sampled.append(points[-1])
+    return sampled
@@ -0,0 +1,236 @@
+"""
+Bounded process-per-job executor for the web apps.
+
+Every job runs in its own process, at most max_workers at a time, with at most
+max_queued more waiting; beyond that submit raises QueueFull, which the apps turn
+into 503 with a Retry-After header. Because a job owns its process, a job that runs
+past its wall-clock timeout, or is cancelled, is actually stopped: the process is
+terminated (and killed if it ignores that), not merely abandoned.
+
+submit returns a concurrent.futures.Future that resolves to the job's return value,
+or fails with JobFailed, JobTimeout or JobCancelled.
+
+Workers are never forked from the (threaded) app: a lock that another thread holds at
+the moment of a fork, such as the job store's or the result cache's, stays locked in
+the child for good. They come from a forkserver, a clean single-threaded process that
+forks them on request, or are spawned afresh where there is none (Windows). Either
+way the job's function and arguments must be picklable, and the module defining the
+function is imported in the worker; preload names modules the forkserver imports once,
+so that each job does not pay for it. Workers also import the main script (as
+__mp_main__), which must therefore not start its application in them; in_job_process
+tells them apart.
+"""
+import math
+import multiprocessing
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many queued jobs, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class JobFailed(Exception):
+    pass
+
+class JobTimeout(Exception):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+
+def in_job_process():
+    """Whether the calling process is a JobRunner worker."""
+    return multiprocessing.current_process().name.startswith('job-')
+
+
+def _child(connection, function, args):
+    try:
+        outcome = ('ok', function(*args))
+    except BaseException as e:
+        traceback.print_exc()
+        outcome = ('error', f"{type(e).__name__}: {e}")
+    connection.send(outcome)
+    connection.close()
+
+
+class _Job:
+    def __init__(self, job_id, function, args, timeout):
+        self.job_id = job_id
+        self.function = function
+        self.args = args
+        self.timeout = timeout
+        self.future = Future()
+        self.process = None
+        self.connection = None
+        self.outcome = None
+        self.started = None
+        self.stop_reason = None
+
+
+class JobRunner:
+    def __init__(self, max_workers=2, max_queued=16, timeout=None, kill_grace=5, poll_interval=0.1, preload=()):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.kill_grace = kill_grace
+        self.poll_interval = poll_interval
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self._average_duration = None
+        self._pending = OrderedDict()
+        self._running = {}
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        # submit writes to this pipe so the dispatcher starts a new job at once, rather
+        # than at its next poll
+        self._wake_receiver, self._wake_sender = multiprocessing.Pipe(duplex=False)
+        # Also what queues or pipes shared with the jobs must be created from
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver' and preload:
+            self.context.set_forkserver_preload(list(preload))
+
+    def __contains__(self, job_id):
+        """Whether job_id is queued or running in this runner."""
+        with self._lock:
+            return job_id in self._pending or job_id in self._running
+
+    @property
+    def queued(self):
+        return len(self._pending)
+
+    @property
+    def running(self):
+        return len(self._running)
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up, from the average job duration."""
+        if self._average_duration is None:
+            return 5
+        return min(max(math.ceil(self._average_duration * (len(self._pending) + 1) / self.max_workers), 1), 600)
+
+    def full(self):
+        with self._lock:
+            return self._full()
+
+    def _full(self):
+        return len(self._pending) + len(self._running) >= self.max_workers + self.max_queued
+
+    def submit(self, job_id, function, args=(), timeout=None, force=False):
+        """
+        Queues function(*args) to run in a new process under job_id (which must not be
+        queued or running already). timeout overrides the runner's; force skips the
+        queue limit (for jobs that were admitted before, e.g. when resuming).
+        """
+        job = _Job(job_id, function, args, self.timeout if timeout is None else timeout)
+        with self._lock:
+            if job_id in self._pending or job_id in self._running:
+                raise ValueError(f"Job {job_id} is already queued or running")
+            if not force and self._full():
+                self.rejected += 1
+                raise QueueFull(self.retry_after())
+            self._pending[job_id] = job
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='job-runner', daemon=True)
+                self._dispatcher.start()
+            self._wake_sender.send_bytes(b'')
+        return job.future
+
+    def cancel(self, job_id):
+        """Cancels a queued job or kills a running one; False if it is neither."""
+        with self._lock:
+            job = self._pending.pop(job_id, None)
+            if job is not None:
+                self.cancelled += 1
+                job.future.set_exception(JobCancelled(f"Job {job_id} was cancelled"))
+                return True
+            job = self._running.get(job_id)
+            if job is None:
+                return False
+            job.stop_reason = 'cancelled'
+        self._stop(job)
+        return True
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                while self._pending and len(self._running) < self.max_workers:
+                    _, job = self._pending.popitem(last=False)
+                    if job.future.set_running_or_notify_cancel():
+                        self._start(job)
+                running = list(self._running.values())
+
+            # Wake up for a new job, a result, an exit or, at the latest, the next poll
+            wait([self._wake_receiver] + [job.connection for job in running] + [job.process.sentinel for job in running], self.poll_interval)
+            while self._wake_receiver.poll():
+                self._wake_receiver.recv_bytes()
+
+            now = time.monotonic()
+            for job in running:
+                # Read the result while the child is alive: a large one fills the pipe
+                if job.outcome is None and job.connection.poll():
+                    try:
+                        job.outcome = job.connection.recv()
+                    except EOFError:
+                        job.outcome = ('error', 'Worker exited without a result')
+                if job.process.is_alive():
+                    if job.timeout and job.stop_reason is None and now - job.started > job.timeout:
+                        job.stop_reason = 'timeout'
+                        self._stop(job)
+                    continue
+                self._finish(job, now)
+
+    def _start(self, job):
+        receiver, sender = self.context.Pipe(duplex=False)
+        job.process = self.context.Process(target=_child, args=(sender, job.function, job.args), name=f"job-{job.job_id}", daemon=True)
+        job.process.start()
+        sender.close()
+        job.connection = receiver
+        job.started = time.monotonic()
+        self._running[job.job_id] = job
+
+    def _stop(self, job):
+        job.process.terminate()
+        job.process.join(self.kill_grace)
+        if job.process.is_alive():
+            job.process.kill()
+
+    def _finish(self, job, now):
+        job.process.join()
+        job.connection.close()
+        with self._lock:
+            del self._running[job.job_id]
+            self.busy_seconds += now - job.started
+            if job.outcome is not None and job.outcome[0] == 'ok':
+                # Finished before a cancel or timeout could stop it
+                self.completed += 1
+                duration = now - job.started
+                self._average_duration = duration if self._average_duration is None else 0.8 * self._average_duration + 0.2 * duration
+                error = None
+            elif job.stop_reason == 'cancelled':
+                self.cancelled += 1
+                error = JobCancelled(f"Job {job.job_id} was cancelled")
+            elif job.stop_reason == 'timeout':
+                self.timed_out += 1
+                error = JobTimeout(f"Timed out after {job.timeout}s")
+            elif job.outcome is None:
+                self.failed += 1
+                error = JobFailed(f"Worker exited with code {job.process.exitcode}")
+            else:
+                self.failed += 1
+                error = JobFailed(job.outcome[1])
+        if error is None:
+            job.future.set_result(job.outcome[1])
+        else:
+            job.future.set_exception(error)
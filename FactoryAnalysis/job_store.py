@@ -0,0 +1,189 @@
+"""
+Persistent store for asynchronous simulation jobs.
+
+A job is a submitted sweep: its form parameters, a status (queued, running, done,
+failed, cancelled), progress in cells, the best configuration so far and the result
+rows in the order they were produced. Everything lives in one SQLite file, so jobs survive a
+restart of the web app, and every process that points at the file (the app and its
+worker processes) sees the same state.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+UNFINISHED = ('queued', 'running')
+
+
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    def create(self, params, key=None):
+        """
+        Records a new queued job for params (a JSON-serializable dict) and returns its id.
+        key identifies equivalent jobs for find.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            with self._db() as connection:
+                connection.execute(
+                    "INSERT INTO jobs (id, status, params, key, done, created_at, updated_at) VALUES (?, 'queued', ?, ?, 0, ?, ?)",
+                    (job_id, json.dumps(params), key, now, now)
+                )
+        return job_id
+
+    def find(self, key, max_age, owned=None):
+        """
+        Id of the newest job with key that is still queued or running, or finished
+        successfully less than max_age seconds ago; None if there is none.
+
+        owned, if given, tells whether an unfinished job is really in progress (e.g.
+        queued in this process's runner); the others, left behind by a process that
+        died, are skipped.
+        """
+        with self._lock:
+            cursor = self._db().execute(
+                f"SELECT id, status FROM jobs WHERE key = ? AND (status IN ({', '.join('?' * len(UNFINISHED))}) "
+                "OR (status = 'done' AND updated_at > ?)) ORDER BY created_at DESC",
+                (key, *UNFINISHED, time.time() - max_age)
+            )
+            for job_id, status in cursor:
+                if status == 'done' or owned is None or owned(job_id):
+                    return job_id
+        return None
+
+    def get(self, job_id):
+        """The job as a dict, or None if there is no such job."""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT id, status, params, done, total, best, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row[0],
+            'status': row[1],
+            'params': json.loads(row[2]),
+            'done': row[3],
+            'total': row[4],
+            'best': json.loads(row[5]) if row[5] else None,
+            'error': row[6],
+            'created_at': row[7],
+            'updated_at': row[8],
+        }
+
+    def rows(self, job_id, offset=0, limit=None, sort=None, descending=False):
+        """
+        Result rows of the job, in production order or ordered by the row field sort
+        (ties in production order).
+        """
+        order = 'seq'
+        params = [job_id]
+        if sort is not None:
+            order = f"json_extract(row, ?) {'DESC' if descending else 'ASC'}, seq"
+            params.append(f"$.{sort}")
+        with self._lock:
+            cursor = self._db().execute(
+                f"SELECT row FROM job_rows WHERE job_id = ? ORDER BY {order} LIMIT ? OFFSET ?",
+                (*params, -1 if limit is None else limit, offset)
+            )
+            return [json.loads(row[0]) for row in cursor]
+
+    def count_rows(self, job_id):
+        with self._lock:
+            (count,) = self._db().execute("SELECT COUNT(*) FROM job_rows WHERE job_id = ?", (job_id,)).fetchone()
+        return count
+
+    def start(self, job_id):
+        self._update(job_id, status='running')
+
+    def record_progress(self, job_id, rows, best, done, total):
+        """Appends rows and updates the progress and the best configuration so far, atomically."""
+        with self._lock:
+            with self._db() as connection:
+                (count,) = connection.execute("SELECT COUNT(*) FROM job_rows WHERE job_id = ?", (job_id,)).fetchone()
+                connection.executemany(
+                    "INSERT INTO job_rows (job_id, seq, row) VALUES (?, ?, ?)",
+                    [(job_id, count + i, json.dumps(row)) for i, row in enumerate(rows)]
+                )
+                connection.execute(
+                    "UPDATE jobs SET done = ?, total = ?, best = ?, updated_at = ? WHERE id = ?",
+                    (done, total, json.dumps(best) if best else None, time.time(), job_id)
+                )
+
+    def finish(self, job_id):
+        self._update(job_id, status='done')
+
+    def fail(self, job_id, error):
+        self._update(job_id, status='failed', error=error)
+
+    def cancel(self, job_id):
+        """Marks a queued or running job cancelled; False if it had already finished."""
+        with self._lock:
+            with self._db() as connection:
+                cursor = connection.execute(
+                    f"UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN ({', '.join('?' * len(UNFINISHED))})",
+                    (time.time(), job_id, *UNFINISHED)
+                )
+        return cursor.rowcount > 0
+
+    def delete(self, job_id):
+        with self._lock:
+            with self._db() as connection:
+                connection.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+                connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def requeue(self, job_id):
+        """Puts an interrupted job back in the queue, dropping its partial results."""
+        with self._lock:
+            with self._db() as connection:
+                connection.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+                connection.execute(
+                    "UPDATE jobs SET status = 'queued', done = 0, total = NULL, best = NULL, updated_at = ? WHERE id = ?",
+                    (time.time(), job_id)
+                )
+
+    def unfinished(self):
+        """Ids of the jobs that were queued or running, oldest first."""
+        with self._lock:
+            cursor = self._db().execute(
+                f"SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(UNFINISHED))}) ORDER BY created_at",
+                UNFINISHED
+            )
+            return [row[0] for row in cursor]
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock:
+            with self._db() as connection:
+                connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _db(self):
+        # SQLite connections must not cross a fork, so each process opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, key TEXT, done INTEGER NOT NULL, "
+                "total INTEGER, best TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            # Job stores written before jobs had keys
+            if 'key' not in [column[1] for column in self._connection.execute("PRAGMA table_info(jobs)")]:
+                self._connection.execute("ALTER TABLE jobs ADD COLUMN key TEXT")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, created_at)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS job_rows ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, row TEXT NOT NULL, PRIMARY KEY (job_id, seq))"
+            )
+            self._connection_pid = os.getpid()
+        return self._connection
@@ -0,0 +1,277 @@
+"""
+Load generator for the Flask simulation endpoints.
+
+Replays a weighted mix of realistic parameter sets against FactoryAnalysis
+/run_simulation or the PVC API's /simulate, at each of several concurrency levels,
+and reports throughput, latency percentiles and error rate per level.
+
+    python load_test.py --target factory --concurrency 1,4,16 --output before.json
+    python load_test.py --target factory --concurrency 1,4,16 --output after.json --compare before.json
+
+By default the app is started locally on a free port for the run (and stopped
+afterwards), with a throwaway job store and no persistent result cache; --url targets an app that is
+already running instead. Each FactoryAnalysis request gets a fresh random seed
+unless --repeat-seeds is given, so the result caches do not turn the test into a
+cache benchmark. The schedule of requests is reproducible from --seed. 503
+responses (queue full) count as errors and are reported separately as rejected.
+
+--compare exits with status 1 if, at any concurrency level, throughput dropped or
+p95 latency rose by more than threshold, or the error rate rose by more than
+threshold in absolute terms.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PVC_DIR = os.path.join(os.path.dirname(HERE), 'PVCManufacture', 'Phase 2')
+
+# (weight, parameters): mostly small what-ifs, some medium sweeps and the odd large one
+FACTORY_MIX = [
+    (5, {'num_parts': '200', 'machine_capacities': '2,4', 'processing_times': '4-6', 'initial_inter_arrival_range': '1-10'}),
+    (3, {'num_parts': '500', 'machine_capacities': '4,6,8', 'processing_times': '4-6,5-7', 'initial_inter_arrival_range': '0.5-10'}),
+    (1, {'num_parts': '2000', 'machine_capacities': '4,8,10', 'processing_times': '4-6,5-7,6-9', 'initial_inter_arrival_range': '0.5-10'}),
+]
+PVC_MIX = [
+    (5, {'actual_demand': 5000, 'num_lines': 2}),
+    (3, {'actual_demand': 20000, 'num_lines': 3, 'production_rate': 120}),
+    (1, {'actual_demand': 100000, 'num_lines': 4, 'breakdown_probability': 0.02}),
+]
+TARGETS = {
+    'factory': {'path': '/run_simulation', 'cwd': HERE, 'app': 'app', 'mix': FACTORY_MIX},
+    'pvc': {'path': '/simulate', 'cwd': PVC_DIR, 'app': os.path.join('Misc', 'api.py'), 'mix': PVC_MIX},
+}
+
+
+def build_request(target, url, parameters, seed):
+    """A urllib Request posting parameters the way the target's clients do."""
+    if target == 'factory':
+        data = urllib.parse.urlencode(dict(parameters, random_seed=str(seed))).encode('ascii')
+        return urllib.request.Request(url, data=data, headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    # The PVC model draws from the unseeded global random module; there is no seed to vary
+    data = json.dumps(parameters).encode('utf-8')
+    return urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+
+def send(request, timeout):
+    """(status, latency in seconds, error or None) of one request."""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status, time.perf_counter() - start, None
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, time.perf_counter() - start, f"HTTP {e.code}"
+    except (urllib.error.URLError, OSError) as e:
+        return None, time.perf_counter() - start, type(e).__name__
+
+def percentile(sorted_values, p):
+    """p-th percentile (0-100) of sorted values, interpolating between ranks."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def run_level(target, url, concurrency, num_requests, duration, timeout, repeat_seeds, rng):
+    """Runs one concurrency level and returns its summary."""
+    mix = TARGETS[target]['mix']
+    weights = [weight for weight, _ in mix]
+    # Draw the whole schedule up front, so that request picking is not timed
+    schedule = [
+        (index, 42 if repeat_seeds else rng.randrange(2 ** 31))
+        for index in rng.choices(range(len(mix)), weights=weights, k=num_requests)
+    ]
+    samples = []
+    lock = threading.Lock()
+    next_request = iter(schedule)
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker():
+        while deadline is None or time.monotonic() < deadline:
+            with lock:
+                item = next(next_request, None)
+            if item is None:
+                return
+            index, seed = item
+            status, latency, error = send(build_request(target, url, mix[index][1], seed), timeout)
+            with lock:
+                samples.append({'mix': index, 'status': status, 'latency': latency, 'error': error})
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    ok = sorted(sample['latency'] for sample in samples if sample['error'] is None)
+    errors = [sample for sample in samples if sample['error'] is not None]
+    by_error = {}
+    for sample in errors:
+        by_error[sample['error']] = by_error.get(sample['error'], 0) + 1
+    return {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'elapsed': elapsed,
+        'throughput': len(ok) / elapsed if elapsed > 0 else 0.0,
+        'error_rate': len(errors) / len(samples) if samples else 0.0,
+        'rejected': sum(1 for sample in errors if sample['status'] == 503),
+        'errors': by_error,
+        'latency': {
+            'mean': sum(ok) / len(ok) if ok else None,
+            'p50': percentile(ok, 50),
+            'p95': percentile(ok, 95),
+            'p99': percentile(ok, 99),
+            'max': ok[-1] if ok else None,
+        },
+        'latency_by_mix': {
+            str(index): percentile(sorted(s['latency'] for s in samples if s['mix'] == index and s['error'] is None), 50)
+            for index in range(len(mix))
+        },
+    }
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def start_app(target, port, state_dir, startup_timeout=60):
+    """
+    Starts the target app with the Flask CLI on port and waits until it answers.
+
+    Its job store goes in state_dir, so the run neither reads nor adds to the real one.
+    """
+    settings = TARGETS[target]
+    # The request log goes to a file: an unread pipe would fill up and stall the app
+    log = tempfile.TemporaryFile(mode='w+')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', settings['app'], 'run', '--port', str(port), '--with-threads', '--no-reload'],
+        cwd=settings['cwd'], env=dict(os.environ, SIMULATION_CACHE='', JOB_STORE=os.path.join(state_dir, '.jobs.sqlite3')), stdout=log, stderr=subprocess.STDOUT
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f"App exited during startup: {log.read().strip()}")
+        try:
+            urllib.request.urlopen(base_url + '/metrics', timeout=1).read()
+            return process, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"App did not answer within {startup_timeout}s")
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(levels, baseline, threshold):
+    """Prints the change of every level against baseline and returns the regressed levels."""
+    previous = {entry['concurrency']: entry for entry in baseline['levels']}
+    regressions = []
+    print(f"{'concurrency':>11} {'req/s':>9} {'change':>8} {'p95 (s)':>9} {'change':>8} {'errors':>7} {'change':>8}")
+    for level in levels:
+        old = previous.get(level['concurrency'])
+        if old is None or old['latency']['p95'] is None or level['latency']['p95'] is None:
+            continue
+        throughput_change = level['throughput'] / old['throughput'] - 1 if old['throughput'] else 0.0
+        p95_change = level['latency']['p95'] / old['latency']['p95'] - 1 if old['latency']['p95'] else 0.0
+        error_change = level['error_rate'] - old['error_rate']
+        regressed = throughput_change < -threshold or p95_change > threshold or error_change > threshold
+        if regressed:
+            regressions.append(level['concurrency'])
+        print(f"{level['concurrency']:>11} {level['throughput']:>9.2f} {throughput_change:>+8.1%} {level['latency']['p95']:>9.3f} {p95_change:>+8.1%}"
+              f" {level['error_rate']:>7.1%} {error_change:>+8.1%}" + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+def parse_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+def format_seconds(value):
+    return f"{value:.3f}" if value is not None else '-'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the simulation endpoints.")
+    parser.add_argument('--target', choices=sorted(TARGETS), default='factory')
+    parser.add_argument('--url', help="Base URL of a running app (default: start one locally)")
+    parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated numbers of concurrent clients")
+    parser.add_argument('--requests', type=int, default=50, help="Requests per concurrency level")
+    parser.add_argument('--duration', type=float, help="Stop a level after this many seconds even if requests remain")
+    parser.add_argument('--timeout', type=float, default=300, help="Seconds before a single request is abandoned")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the request schedule")
+    parser.add_argument('--repeat-seeds', action='store_true', help="Send the same parameters repeatedly (exercises the caches)")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed relative regression before --compare fails")
+    args = parser.parse_args()
+
+    process = None
+    state_dir = None
+    base_url = args.url
+    if base_url is None:
+        state_dir = tempfile.TemporaryDirectory(prefix='load-test-')
+        process, base_url = start_app(args.target, free_port(), state_dir.name)
+    url = base_url.rstrip('/') + TARGETS[args.target]['path']
+
+    levels = []
+    try:
+        print(f"{'concurrency':>11} {'requests':>9} {'req/s':>9} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'errors':>7} {'rejected':>9}")
+        for concurrency in parse_list(args.concurrency):
+            level = run_level(args.target, url, concurrency, args.requests, args.duration, args.timeout,
+                              args.repeat_seeds, random.Random(f"{args.seed}:{concurrency}"))
+            levels.append(level)
+            latency = level['latency']
+            print(f"{concurrency:>11} {level['requests']:>9} {level['throughput']:>9.2f} {format_seconds(latency['p50']):>9}"
+                  f" {format_seconds(latency['p95']):>9} {format_seconds(latency['p99']):>9} {level['error_rate']:>7.1%} {level['rejected']:>9}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            state_dir.cleanup()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': args.target,
+            'url': url,
+            'requests_per_level': args.requests,
+            'duration': args.duration,
+            'repeat_seeds': args.repeat_seeds,
+            'mix': TARGETS[args.target]['mix'],
+        },
+        'levels': levels,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        regressions = compare(levels, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} concurrency level(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
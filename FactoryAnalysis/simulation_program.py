@@ -1,12 +1,234 @@
-import sys
+import argparse
+import hashlib
+import math
+import os
 import simpy
 import random
+import sys
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, asdict
+from statistics import NormalDist, fmean, stdev
+from typing import List, Optional, Tuple
+from result_cache import ResultCache
+from streaming_stats import RunningStats, WaitStatistics
+
+
+def _model_version():
+    """Hash of the model sources, so cached results die with the code that made them."""
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('simulation_program.py', 'queue_engine.py', 'streaming_stats.py'):
+        with open(os.path.join(here, name), 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+# In-memory LRU, sized by SIMULATION_CACHE_ENTRIES (0: no caching at all). Setting
+# SIMULATION_CACHE to a file adds a SQLite tier shared between processes and runs,
+# holding at most SIMULATION_CACHE_DISK_ENTRIES results of at most
+# SIMULATION_CACHE_MAX_AGE seconds (0: no age limit)
+RESULT_CACHE = ResultCache(
+    path=os.environ.get('SIMULATION_CACHE') or None,
+    max_entries=int(os.environ.get('SIMULATION_CACHE_ENTRIES', 4096)),
+    model_version=_model_version(),
+    max_disk_entries=int(os.environ.get('SIMULATION_CACHE_DISK_ENTRIES', 100000)),
+    max_age=float(os.environ.get('SIMULATION_CACHE_MAX_AGE', 7 * 24 * 3600))
+)
+
+def use_cache_file(path):
+    """
+    Adds the SQLite tier at path to RESULT_CACHE, here and in every process started
+    from now on, unless SIMULATION_CACHE has a say already (empty: memory only).
+
+    For apps whose sweeps run in fresh worker processes: their in-memory caches start
+    empty, so overlapping sweeps only share runs through the file.
+    """
+    if 'SIMULATION_CACHE' in os.environ:
+        return
+    os.environ['SIMULATION_CACHE'] = path
+    RESULT_CACHE.path = path
+
+# How the SimPy backend represents arrivals: 'process' (one SimPy process per part) or
+# 'token' (see token_generator). Both give identical results; SIMULATION_ARRIVAL_MODE
+# sets the default for runs that do not choose.
+ARRIVAL_MODE = os.environ.get('SIMULATION_ARRIVAL_MODE', 'process')
+
+# profiling.Profiler collecting phase timings, event counts and stacks of every run;
+# set by the --profile CLI flag, None otherwise
+PROFILER = None
+
+
+@dataclass
+class SimulationResult:
+    """Outcome of one simulated (capacity, processing time, interval) configuration."""
+    machine_capacity: int
+    processing_time: Tuple[float, float]
+    interval: Tuple[float, float]
+    avg_waiting_time: Optional[float]
+    machine_utilization: Optional[float]
+    replications: int = 1
+    avg_waiting_time_ci: Optional[Tuple[float, float]] = None
+    machine_utilization_ci: Optional[Tuple[float, float]] = None
+    # 'simulated'; with find_best_configuration(prune=True) also 'probe' for the runs
+    # that bound a cell, and 'pruned' for the cells it skipped
+    status: str = 'simulated'
 
-# Metrics
-waiting_times = []
-machine_busy_time = 0
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class SearchResult:
+    """Everything find_best_configuration produced for one sweep."""
+    num_parts: int
+    results: List[SimulationResult] = field(default_factory=list)
+    best: Optional[SimulationResult] = None
+    screened: List[Tuple[int, Tuple[float, float]]] = field(default_factory=list)
+    simulations_saved: int = 0
+
+    @property
+    def simulations(self):
+        """Number of run_simulation calls the sweep spent."""
+        return sum(result.replications for result in self.results)
+
+    @property
+    def best_configuration(self):
+        """Legacy (machine_capacity, num_parts, interval, processing_time) tuple."""
+        if self.best is None:
+            return None
+        return (self.best.machine_capacity, self.num_parts, self.best.interval, self.best.processing_time)
+
+    @property
+    def min_avg_waiting_time(self):
+        return self.best.avg_waiting_time if self.best else float('inf')
+
+    @property
+    def max_utilization(self):
+        return self.best.machine_utilization if self.best else 0
+
+    def to_dict(self):
+        return {
+            'num_parts': self.num_parts,
+            'results': [result.to_dict() for result in self.results],
+            'best': self.best.to_dict() if self.best else None,
+            'simulations': self.simulations,
+            'screened': self.screened,
+            'simulations_saved': self.simulations_saved,
+        }
+
+
+@dataclass
+class RunSummary:
+    """
+    Output statistics of a single run, gathered in constant memory.
+
+    The wait percentiles are None unless they were asked for (run_summary's percentiles).
+    """
+    avg_waiting_time: float
+    machine_utilization: float
+    wait_stdev: float = 0.0
+    max_waiting_time: float = 0.0
+    wait_p50: Optional[float] = None
+    wait_p95: Optional[float] = None
+    wait_p99: Optional[float] = None
+    avg_queue_length: float = 0.0
 
-def part(env, name, machine):
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class MetricEstimate:
+    """Point estimate with the half-width of its confidence interval."""
+    mean: float
+    half_width: float
+
+    @property
+    def ci(self):
+        return (self.mean - self.half_width, self.mean + self.half_width)
+
+
+@dataclass
+class ReplicationResult:
+    """Outcome of run_replications for one configuration."""
+    avg_waiting_time: MetricEstimate
+    machine_utilization: MetricEstimate
+    replications: int
+    converged: bool
+    confidence: float = 0.95
+
+    def to_dict(self):
+        return {
+            'avg_waiting_time': self.avg_waiting_time.mean,
+            'avg_waiting_time_ci': self.avg_waiting_time.ci,
+            'machine_utilization': self.machine_utilization.mean,
+            'machine_utilization_ci': self.machine_utilization.ci,
+            'replications': self.replications,
+            'converged': self.converged,
+            'confidence': self.confidence,
+        }
+
+
+@dataclass
+class BatchMeansResult:
+    """Outcome of run_batch_means: steady-state estimates from one long run."""
+    avg_waiting_time: MetricEstimate
+    machine_utilization: MetricEstimate
+    warmup_parts: int
+    num_batches: int
+    batch_size: int
+    lag1_autocorrelation: float
+    independent: bool
+    confidence: float = 0.95
+
+    def to_dict(self):
+        return {
+            'avg_waiting_time': self.avg_waiting_time.mean,
+            'avg_waiting_time_ci': self.avg_waiting_time.ci,
+            'machine_utilization': self.machine_utilization.mean,
+            'machine_utilization_ci': self.machine_utilization.ci,
+            'warmup_parts': self.warmup_parts,
+            'num_batches': self.num_batches,
+            'batch_size': self.batch_size,
+            'lag1_autocorrelation': self.lag1_autocorrelation,
+            'independent': self.independent,
+            'confidence': self.confidence,
+        }
+
+
+class MicroBatches:
+    """
+    Per-part output of a long run, reduced to fixed-size groups of consecutive parts.
+
+    Keeps, for every group of size parts (in arrival order), the mean wait, the total
+    processing time and the arrival time of its last part. A trailing partial group
+    is dropped.
+    """
+
+    def __init__(self, size=5):
+        self.size = size
+        self.wait_means = array('d')
+        self.service_sums = array('d')
+        self.end_arrivals = array('d')
+        self._count = 0
+        self._wait_sum = 0.0
+        self._service_sum = 0.0
+
+    def add(self, arrival_time, wait, service):
+        self._count += 1
+        self._wait_sum += wait
+        self._service_sum += service
+        if self._count == self.size:
+            self.wait_means.append(self._wait_sum / self.size)
+            self.service_sums.append(self._service_sum)
+            self.end_arrivals.append(arrival_time)
+            self._count = 0
+            self._wait_sum = self._service_sum = 0.0
+
+
+def part(env, name, machine, rng, processing_time, metrics, processing_duration=None):
     """Represents a part going through the process."""
     arrival_time = env.now
 
@@ -14,128 +236,970 @@ def part(env, name, machine):
     with machine.request() as request:
         yield request
         wait = env.now - arrival_time
-        waiting_times.append(wait)
+        metrics['waiting_times'].add(wait)
 
         # Simulate processing
-        global machine_busy_time
-        processing_duration = random.uniform(*PROCESSING_TIME)
-        machine_busy_time += processing_duration
+        if processing_duration is None:
+            processing_duration = rng.uniform(*processing_time)
+        metrics['machine_busy_time'] += processing_duration
+        if 'micro_batches' in metrics:
+            metrics['micro_batches'].add(arrival_time, wait, processing_duration)
         yield env.timeout(processing_duration)
 
-def part_generator(env, machine):
-    """Generates parts arriving randomly."""
-    for i in range(NUM_PARTS):
-        yield env.timeout(random.uniform(*INTER_ARRIVAL_TIME))
-        env.process(part(env, f"Part-{i+1}", machine))
+def part_generator(env, machine, arrival_rng, service_rng, num_parts, inter_arrival_time, processing_time, metrics, crn=False):
+    """
+    Generates parts arriving randomly.
+
+    With crn the i-th part always gets the i-th draw of the service stream, so its
+    processing time does not depend on the order in which parts reach a machine.
+    """
+    for i in range(num_parts):
+        yield env.timeout(arrival_rng.uniform(*inter_arrival_time))
+        processing_duration = service_rng.uniform(*processing_time) if crn else None
+        env.process(part(env, f"Part-{i+1}", machine, service_rng, processing_time, metrics, processing_duration))
 
-def run_simulation(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity):
-    global RANDOM_SEED, NUM_PARTS, INTER_ARRIVAL_TIME, PROCESSING_TIME
-    global waiting_times, machine_busy_time
+class PartTokens:
+    """
+    Array-backed part records for arrival_mode='token'.
+
+    Part i is just the index i: its arrival time (and with crn its processing time)
+    sits in preallocated arrays. Service is FIFO, so the queue is the index range
+    next_part .. arrived - 1 and needs no container of its own.
+    """
 
-    # Assign parameters
-    RANDOM_SEED = random_seed
-    NUM_PARTS = num_parts
-    INTER_ARRIVAL_TIME = inter_arrival_time
-    PROCESSING_TIME = processing_time
+    def __init__(self, num_parts, crn=False):
+        self.arrival_times = array('d', bytes(8 * num_parts))
+        self.processing_times = array('d', bytes(8 * num_parts)) if crn else None
+        self.arrived = 0
+        self.next_part = 0
+        # Wake-up events of the machines waiting for work
+        self.idle = deque()
 
-    # Reset metrics
-    waiting_times = []
-    machine_busy_time = 0
+    def __len__(self):
+        return self.arrived - self.next_part
 
+
+def token_generator(env, tokens, arrival_rng, service_rng, num_parts, inter_arrival_time, processing_time, metrics, crn=False):
+    """
+    part_generator for arrival_mode='token': records arrivals instead of spawning parts.
+
+    Random numbers are drawn at the same simulated instants and in the same order as
+    with part_generator, so both modes produce identical statistics.
+    """
+    for i in range(num_parts):
+        yield env.timeout(arrival_rng.uniform(*inter_arrival_time))
+        tokens.arrival_times[i] = env.now
+        if crn:
+            tokens.processing_times[i] = service_rng.uniform(*processing_time)
+        tokens.arrived += 1
+        if tokens.idle:
+            tokens.idle.popleft().succeed()
+
+def machine_worker(env, tokens, service_rng, processing_time, metrics, crn=False):
+    """One machine of the pool, serving parts from tokens in arrival order."""
+    while True:
+        if not tokens:
+            wake = env.event()
+            tokens.idle.append(wake)
+            yield wake
+            continue
+
+        i = tokens.next_part
+        tokens.next_part += 1
+        wait = env.now - tokens.arrival_times[i]
+        metrics['waiting_times'].add(wait)
+
+        processing_duration = tokens.processing_times[i] if crn else service_rng.uniform(*processing_time)
+        metrics['machine_busy_time'] += processing_duration
+        if 'micro_batches' in metrics:
+            metrics['micro_batches'].add(tokens.arrival_times[i], wait, processing_duration)
+        yield env.timeout(processing_duration)
+
+def make_streams(random_seed, crn=False, replication=0):
+    """
+    Returns the (arrival_rng, service_rng) pair for one run.
+
+    Without crn both draws come from a single random.Random(random_seed), as they always
+    have. With crn arrivals and services get dedicated streams derived from the seed, so
+    two runs with the same seed see the same uniforms in the same order and differ only
+    by the parameters under comparison (common random numbers). Replication 0 is the
+    plain seed; later replications get independent streams derived from it.
+    """
+    seed = random_seed if replication == 0 else f"{random_seed}:{replication}"
+    if not crn:
+        rng = random.Random(seed)
+        return rng, rng
+    return random.Random(f"{seed}:arrivals"), random.Random(f"{seed}:services")
+
+def run_simulation(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn=False, replication=0, backend='simpy', use_cache=True, arrival_mode=None):
+    """
+    Simulate num_parts parts through a pool of machine_capacity machines.
+
+    Returns (avg_waiting_time, machine_utilization). All state is local to the call,
+    so concurrent runs (e.g. from Flask request threads) do not interfere.
+
+    backend='numpy' evaluates the same FIFO multi-machine queue with queue_engine instead
+    of SimPy. It draws from NumPy generators (always on common random numbers), so its
+    numbers match SimPy in distribution rather than draw for draw.
+
+    arrival_mode picks how the SimPy backend models parts (default ARRIVAL_MODE):
+    'process' runs one SimPy process per part, 'token' keeps parts as indices into
+    arrays served by one process per machine (PartTokens), for several times fewer
+    events and allocations. The results are identical.
+
+    Results are memoized in RESULT_CACHE unless use_cache is False. run_summary takes
+    the same arguments and returns the full RunSummary (spread and, on request, wait
+    percentiles).
+    """
+    summary = run_summary(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn, replication, backend, use_cache, arrival_mode)
+    return summary.avg_waiting_time, summary.machine_utilization
+
+def run_summary(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn=False, replication=0, backend='simpy', use_cache=True, arrival_mode=None, percentiles=False):
+    """
+    run_simulation, returning the RunSummary of the run.
+
+    The SimPy backend only tracks p50/p95/p99 waits when percentiles is set: the three
+    P-squared estimators cost several times more per part than the running mean.
+    """
+    if backend not in ('simpy', 'numpy'):
+        raise ValueError(f"Unknown simulation backend: {backend}")
+    arrival_mode = arrival_mode or ARRIVAL_MODE
+    if arrival_mode not in ('process', 'token'):
+        raise ValueError(f"Unknown arrival mode: {arrival_mode}")
+    if not use_cache or not RESULT_CACHE.enabled:
+        return _simulate(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn, replication, backend, arrival_mode, percentiles)
+
+    key = RESULT_CACHE.key(
+        random_seed=random_seed,
+        num_parts=int(num_parts),
+        inter_arrival_time=[float(value) for value in inter_arrival_time],
+        processing_time=[float(value) for value in processing_time],
+        machine_capacity=int(machine_capacity),
+        # The numpy backend is always on common random numbers
+        crn=bool(crn) or backend == 'numpy',
+        replication=int(replication),
+        backend=backend,
+        # arrival_mode is deliberately not part of the key: both modes give the same results
+        percentiles=bool(percentiles) and backend == 'simpy',
+    )
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        return RunSummary(**cached)
+
+    summary = _simulate(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn, replication, backend, arrival_mode, percentiles)
+    RESULT_CACHE.put(key, summary.to_dict())
+    return summary
+
+def _simulate(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn, replication, backend, arrival_mode='process', percentiles=False):
+    with PROFILER.run() if PROFILER else nullcontext():
+        if backend == 'numpy':
+            import queue_engine
+            with _phase('numpy'):
+                return RunSummary(**queue_engine.simulate_summary(
+                    random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, replication
+                ))
+
+        with _phase('setup'):
+            # Reset metrics: running statistics only, nothing grows with num_parts
+            metrics = {'waiting_times': WaitStatistics() if percentiles else RunningStats(), 'machine_busy_time': 0}
+            env = _build_model(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn, replication, metrics, arrival_mode)
+
+        # Run the simulation
+        with _phase('env.run'):
+            env.run()
+
+        # Calculate metrics
+        with _phase('metrics'):
+            waits = metrics['waiting_times']
+            running = waits.running if percentiles else waits
+            total_time = env.now
+            machine_utilization = (metrics['machine_busy_time'] / (total_time * machine_capacity)) * 100 if total_time else 0
+
+            summary = RunSummary(
+                avg_waiting_time=running.mean,
+                machine_utilization=machine_utilization,
+                wait_stdev=running.stdev,
+                max_waiting_time=running.max if running.count else 0.0,
+                # Little's law: the area under the queue length is the sum of the waits
+                avg_queue_length=running.mean * running.count / total_time if total_time else 0.0,
+            )
+            if percentiles:
+                quantiles = waits.summary()
+                summary.wait_p50, summary.wait_p95, summary.wait_p99 = quantiles['p50'], quantiles['p95'], quantiles['p99']
+            return summary
+
+def _build_model(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn, replication, metrics, arrival_mode):
+    """Build the SimPy model and return its environment, ready to run."""
     # Initialize environment and resources
-    random.seed(RANDOM_SEED)
-    env = simpy.Environment()
-    machine = simpy.Resource(env, capacity=machine_capacity)
+    arrival_rng, service_rng = make_streams(random_seed, crn, replication)
+    env = PROFILER.environment() if PROFILER else simpy.Environment()
+
+    if arrival_mode == 'token':
+        tokens = PartTokens(num_parts, crn)
+        for _ in range(machine_capacity):
+            env.process(machine_worker(env, tokens, service_rng, processing_time, metrics, crn))
+        env.process(token_generator(env, tokens, arrival_rng, service_rng, num_parts, inter_arrival_time, processing_time, metrics, crn))
+    else:
+        machine = simpy.Resource(env, capacity=machine_capacity)
+        # Start the part generator
+        env.process(part_generator(env, machine, arrival_rng, service_rng, num_parts, inter_arrival_time, processing_time, metrics, crn))
+    return env
+
+def _phase(name):
+    """Times a phase of the current run under --profile; a no-op otherwise."""
+    return PROFILER.phase(name) if PROFILER else nullcontext()
+
+def cache_stats():
+    """Hit/miss counters of this process's result cache."""
+    return RESULT_CACHE.stats()
 
-    # Start the part generator
-    env.process(part_generator(env, machine))
+def t_quantile(p, df):
+    """
+    Quantile of Student's t distribution with df degrees of freedom.
+
+    Exact for df 1 and 2, Cornish-Fisher expansion around the normal quantile
+    beyond that (accurate to about 1e-3 from df=3).
+    """
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) * math.sqrt(2 / (4 * p * (1 - p)))
+    z = NormalDist().inv_cdf(p)
+    return (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+        + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4)
+    )
+
+def estimate(values, confidence=0.95):
+    """Mean and t-based confidence half-width of independent observations."""
+    n = len(values)
+    mean = fmean(values)
+    if n < 2:
+        return MetricEstimate(mean, float('inf'))
+    half_width = t_quantile(0.5 + confidence / 2, n - 1) * stdev(values) / math.sqrt(n)
+    return MetricEstimate(mean, half_width)
+
+def run_replications(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity,
+                     wait_precision=0.5, utilization_precision=1.0, confidence=0.95,
+                     min_replications=5, max_replications=100, crn=False, backend='simpy'):
+    """
+    Run independent replications until both confidence intervals are tight enough.
+
+    Replications are added after min_replications until the half-width of the average
+    waiting time is at most wait_precision (minutes) and that of the machine utilization
+    at most utilization_precision (percentage points), or max_replications is reached.
+    Replication r of a configuration uses the same streams as replication r of any other
+    configuration with the same seed, so with crn results stay comparable.
+
+    SimPy adds one replication at a time. The numpy backend runs each step as one
+    batched pass (queue_engine.simulate_batch) sized from the current variance estimate.
+    """
+    min_replications = max(2, min_replications)
+    waits, utilizations = [], []
+    batch = min_replications
+
+    while True:
+        if backend == 'numpy':
+            import queue_engine
+            batch_waits, batch_utilizations = queue_engine.simulate_batch(
+                random_seed, batch, num_parts, inter_arrival_time, processing_time, machine_capacity,
+                first_replication=len(waits)
+            )
+            waits.extend(batch_waits.tolist())
+            utilizations.extend(batch_utilizations.tolist())
+        else:
+            for _ in range(batch):
+                avg_waiting_time, machine_utilization = run_simulation(
+                    random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity,
+                    crn, replication=len(waits), backend=backend
+                )
+                waits.append(avg_waiting_time)
+                utilizations.append(machine_utilization)
 
-    # Run the simulation
-    env.run()
+        wait_estimate = estimate(waits, confidence)
+        utilization_estimate = estimate(utilizations, confidence)
+        converged = (wait_estimate.half_width <= wait_precision
+                     and utilization_estimate.half_width <= utilization_precision)
+        if converged or len(waits) >= max_replications:
+            return ReplicationResult(
+                avg_waiting_time=wait_estimate,
+                machine_utilization=utilization_estimate,
+                replications=len(waits),
+                converged=converged,
+                confidence=confidence
+            )
 
-    # Calculate metrics
-    avg_waiting_time = sum(waiting_times) / len(waiting_times) if waiting_times else 0
-    total_time = env.now
-    machine_utilization = (machine_busy_time / (total_time * machine_capacity)) * 100
+        batch = 1
+        if backend == 'numpy':
+            # Half-widths shrink like 1/sqrt(n): jump straight to the projected total
+            ratio = max(wait_estimate.half_width / wait_precision if wait_precision > 0 else float('inf'),
+                        utilization_estimate.half_width / utilization_precision if utilization_precision > 0 else float('inf'))
+            projected = math.ceil(len(waits) * ratio ** 2) if math.isfinite(ratio) else max_replications
+            batch = max(1, projected - len(waits))
+        batch = min(batch, max_replications - len(waits))
 
-    return avg_waiting_time, machine_utilization
+def mser_truncation(values):
+    """
+    Number of leading values to discard as warm-up, by the MSER rule.
 
-def find_best_configuration(random_seed, num_parts, processing_times, machine_capacities, initial_inter_arrival_range, tolerance=0.1, max_iterations=10):
+    Picks the d (at most half the values) minimising the squared standard error of
+    the mean of values[d:]. Applied to means of groups of 5 observations this is MSER-5.
+    """
+    n = len(values)
+    # Suffix sums give every candidate's variance in one backward pass
+    suffix_sum = suffix_squares = 0.0
+    best_d, best_mser = 0, float('inf')
+    mser_by_d = [0.0] * (n + 1)
+    for d in range(n - 1, -1, -1):
+        suffix_sum += values[d]
+        suffix_squares += values[d] ** 2
+        remaining = n - d
+        mser_by_d[d] = (suffix_squares - suffix_sum ** 2 / remaining) / remaining ** 2
+    for d in range(n // 2 + 1):
+        if mser_by_d[d] < best_mser:
+            best_d, best_mser = d, mser_by_d[d]
+    return best_d
+
+def lag1_autocorrelation(values):
+    n = len(values)
+    mean = fmean(values)
+    denominator = sum((value - mean) ** 2 for value in values)
+    if n < 3 or denominator == 0:
+        return 0.0
+    return sum((values[i] - mean) * (values[i + 1] - mean) for i in range(n - 1)) / denominator
+
+def run_batch_means(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity,
+                    num_batches=20, min_batches=10, confidence=0.95, crn=False, backend='simpy', arrival_mode=None):
+    """
+    Steady-state estimates from a single long run, by the method of batch means.
+
+    The run's waits are grouped in fives; MSER-5 picks the warm-up to discard, and the
+    remaining parts are split into num_batches equal batches (the parts that do not
+    divide evenly are dropped from the front, along with the warm-up). The batch means
+    give t confidence intervals for the average wait and the machine utilization.
+
+    Batch means are only independent when batches are much longer than the wait
+    autocorrelation. If the lag-1 autocorrelation of the wait batch means is
+    significant, adjacent batches are merged pairwise (while at least min_batches
+    remain); independent reports whether the final batches passed the check.
+
+    Utilization per batch is the processing time of the batch's parts over the
+    machine time between its first and last arrival, which matches busy time over
+    elapsed time in steady state.
+    """
+    if backend not in ('simpy', 'numpy'):
+        raise ValueError(f"Unknown simulation backend: {backend}")
+
+    if backend == 'numpy':
+        import queue_engine
+        micro_batches = queue_engine.micro_batches(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity)
+    else:
+        micro_batches = MicroBatches()
+        metrics = {'waiting_times': RunningStats(), 'machine_busy_time': 0, 'micro_batches': micro_batches}
+        _build_model(random_seed, num_parts, inter_arrival_time, processing_time, machine_capacity, crn, 0, metrics,
+                     arrival_mode or ARRIVAL_MODE).run()
+
+    wait_means = micro_batches.wait_means
+    warmup = mser_truncation(wait_means)
+    batch_size = (len(wait_means) - warmup) // num_batches
+    if batch_size < 1:
+        raise ValueError(f"{num_parts} parts are too few for {num_batches} batches")
+    warmup = len(wait_means) - batch_size * num_batches
+
+    def batch_statistics(size):
+        waits, utilizations = [], []
+        for start in range(warmup, len(wait_means), size):
+            stop = start + size
+            previous_arrival = micro_batches.end_arrivals[start - 1] if start else 0.0
+            elapsed = micro_batches.end_arrivals[stop - 1] - previous_arrival
+            waits.append(fmean(wait_means[start:stop]))
+            utilizations.append(sum(micro_batches.service_sums[start:stop]) / (elapsed * machine_capacity) * 100)
+        return waits, utilizations
+
+    waits, utilizations = batch_statistics(batch_size)
+    correlation = lag1_autocorrelation(waits)
+    # One-sided test of the lag-1 autocorrelation at 5%, se ~ 1/sqrt(batches)
+    independent = correlation <= NormalDist().inv_cdf(0.95) / math.sqrt(len(waits))
+    while not independent and len(waits) // 2 >= min_batches:
+        batch_size *= 2
+        num_batches = len(waits) // 2
+        warmup = len(wait_means) - batch_size * num_batches
+        waits, utilizations = batch_statistics(batch_size)
+        correlation = lag1_autocorrelation(waits)
+        independent = correlation <= NormalDist().inv_cdf(0.95) / math.sqrt(len(waits))
+
+    return BatchMeansResult(
+        avg_waiting_time=estimate(waits, confidence),
+        machine_utilization=estimate(utilizations, confidence),
+        warmup_parts=warmup * micro_batches.size,
+        num_batches=len(waits),
+        batch_size=batch_size * micro_batches.size,
+        lag1_autocorrelation=correlation,
+        independent=independent,
+        confidence=confidence
+    )
+
+def is_better(result, best):
+    """
+    Selection rule shared by the per-cell narrowing and the sweep-wide best.
+
+    Configurations meeting the criteria (utilization >= 95% and wait <= 5 minutes)
+    win on lower wait or higher utilization; otherwise higher utilization wins,
+    with lower wait breaking ties.
+    """
+    min_avg_waiting_time = best.avg_waiting_time if best else float('inf')
+    max_utilization = best.machine_utilization if best else 0
+
+    if result.machine_utilization >= 95 and result.avg_waiting_time <= 5:
+        return result.avg_waiting_time < min_avg_waiting_time or result.machine_utilization > max_utilization
+    return result.machine_utilization > max_utilization or (
+        result.machine_utilization == max_utilization and result.avg_waiting_time < min_avg_waiting_time
+    )
+
+def select_best(results, best=None):
+    """Replays is_better over results in order and returns the winner."""
+    for result in results:
+        if is_better(result, best):
+            best = result
+    return best
+
+def search_cell(random_seed, num_parts, machine_capacity, processing_time, initial_inter_arrival_range, tolerance=0.1, max_iterations=10, crn=False, backend='simpy'):
+    """
+    Interval-halving search over the inter-arrival range for one (capacity, processing time) cell.
+
+    The narrowing only looks at this cell's own results, so cells are independent
+    and can be evaluated in any order or in parallel. With crn both halves of each
+    split are simulated on common random numbers, so their comparison reflects the
+    interval rather than sampling noise.
+    """
+    results = []
+    cell_best = None
+    low, high = initial_inter_arrival_range
+    iteration = 0
+
+    while (high - low > tolerance) and (iteration < max_iterations):
+        iteration += 1
+        mid = (low + high) / 2
+        intervals = [(low, mid), (mid, high)]
+
+        for interval in intervals:
+            avg_waiting_time, machine_utilization = run_simulation(
+                random_seed, num_parts, interval, processing_time, machine_capacity, crn, backend=backend
+            )
+
+            # Log the results
+            result = SimulationResult(
+                machine_capacity=machine_capacity,
+                processing_time=processing_time,
+                interval=interval,
+                avg_waiting_time=avg_waiting_time,
+                machine_utilization=machine_utilization
+            )
+            results.append(result)
+            if is_better(result, cell_best):
+                cell_best = result
+
+        # Narrow down the range
+        if cell_best and cell_best.interval == (low, mid):
+            high = mid
+        else:
+            low = mid
+
+    return results
+
+def search_cell_stochastic(random_seed, num_parts, machine_capacity, processing_time, initial_inter_arrival_range,
+                           tolerance=0.1, max_iterations=10, backend='simpy',
+                           target_utilization=95, max_wait=5, wait_precision=0.5, utilization_precision=1.0):
+    """
+    Stochastic root-finding over the inter-arrival range for one (capacity, processing time) cell.
+
+    Candidate intervals are windows of width tolerance centred on x. All runs use common
+    random numbers, so along the sample path both the wait and the utilization fall as x
+    grows and the search reduces to finding roots of monotone functions:
+
+    1. Utilization root: utilization is close to k / x, so starting from the offered-load
+       estimate x = E[processing] / (capacity * target), each secant step
+       x <- x * utilization(x) / target usually lands within half a point in one or two runs.
+    2. Wait SLA: if the wait at that x is within max_wait, steps of doubling size towards
+       the lower end of the range look for the smallest x (highest utilization) that
+       still keeps it there, and bisection narrows the last step to within tolerance.
+       Otherwise the cell cannot meet both criteria and the search stops.
+
+    If the chosen window can meet the criteria it is re-run with run_replications, so the
+    cell's final row carries confidence intervals; every row reports how many
+    simulations it cost.
+    """
+    low_bound, high_bound = initial_inter_arrival_range
+    width = min(tolerance, high_bound - low_bound)
+    x_min, x_max = low_bound + width / 2, high_bound - width / 2
+    evaluations = {}
+    results = []
+
+    def window(x):
+        return (x - width / 2, x + width / 2)
+
+    def evaluate(x):
+        x = min(max(x, x_min), x_max)
+        if x not in evaluations:
+            interval = window(x)
+            avg_waiting_time, machine_utilization = run_simulation(
+                random_seed, num_parts, interval, processing_time, machine_capacity, True, backend=backend
+            )
+            results.append(SimulationResult(machine_capacity, processing_time, interval, avg_waiting_time, machine_utilization))
+            evaluations[x] = (avg_waiting_time, machine_utilization)
+        return x, evaluations[x]
+
+    # 1. Utilization root, secant steps on the k / x model
+    mean_processing = sum(processing_time) / 2
+    x, (wait, utilization) = evaluate(mean_processing * 100 / (machine_capacity * target_utilization))
+    for _ in range(3):
+        if abs(utilization - target_utilization) <= utilization_precision / 2 or utilization <= 0:
+            break
+        next_x, (next_wait, next_utilization) = evaluate(x * utilization / target_utilization)
+        if next_x == x:
+            break
+        x, wait, utilization = next_x, next_wait, next_utilization
+
+    # 2. Push towards higher load while the wait stays within the SLA: widen the step
+    #    until the SLA breaks, then bisect the last step down to tolerance
+    if wait <= max_wait:
+        step = tolerance
+        infeasible_x = None
+        while x > x_min and len(evaluations) < 2 * max_iterations:
+            candidate, (candidate_wait, _) = evaluate(x - step)
+            if candidate_wait > max_wait:
+                infeasible_x = candidate
+                break
+            x = candidate
+            step *= 2
+        while infeasible_x is not None and x - infeasible_x > tolerance and len(evaluations) < 2 * max_iterations:
+            mid, (mid_wait, _) = evaluate((x + infeasible_x) / 2)
+            if mid_wait <= max_wait:
+                x = mid
+            else:
+                infeasible_x = mid
+        wait, utilization = evaluations[x]
+
+    # 3. Replication-backed estimate for the chosen window, if it can meet the criteria
+    if wait > max_wait or utilization < target_utilization - utilization_precision:
+        return results
+    replicated = run_replications(
+        random_seed, num_parts, window(x), processing_time, machine_capacity,
+        wait_precision=wait_precision, utilization_precision=utilization_precision,
+        min_replications=3, max_replications=10, crn=True, backend=backend
+    )
+    results.append(SimulationResult(
+        machine_capacity, processing_time, window(x),
+        replicated.avg_waiting_time.mean, replicated.machine_utilization.mean,
+        replications=replicated.replications,
+        avg_waiting_time_ci=replicated.avg_waiting_time.ci,
+        machine_utilization_ci=replicated.machine_utilization.ci
+    ))
+    return results
+
+def _search_cell_args(args):
+    search, cell_args = args
+    if search == 'stochastic':
+        return search_cell_stochastic(*cell_args)
+    return search_cell(*cell_args)
+
+def find_best_configuration(random_seed, num_parts, processing_times, machine_capacities, initial_inter_arrival_range, tolerance=0.1, max_iterations=10, workers=1, crn=False, backend='simpy', search='bisection', prescreen=False, prune=False, record_pruned=False, budget=40, on_progress=None):
     """
     Find the best configuration for processing a fixed number of parts using multiple machines.
+
+    Every (machine_capacity, processing_time) cell runs its own search. With workers > 1
+    (or None for one per CPU) the cells are farmed out to a process pool. Every run is
+    seeded from random_seed alone, and results are merged in grid order, so the output
+    is identical to the serial path. crn switches every run to common random numbers
+    (see make_streams) and backend selects the engine used by run_simulation.
+
+    search='stochastic' replaces the interval halving with search_cell_stochastic, which
+    always runs on common random numbers and ends each cell with a replicated estimate.
+    The replications take back most of what the root-finding saves: on the grids tried
+    it ran between 5% and 25% fewer simulations than the bisection, more on larger
+    num_parts, and on some grids about as many.
+
+    prescreen evaluates the whole grid with the analytic queueing approximations in
+    queueing_models first and skips the cells that clearly cannot meet the criteria.
+    They are listed in SearchResult.screened, with the simulations they would have cost
+    in simulations_saved (exact for bisection, a lower bound of one per cell for the
+    stochastic search).
+
+    prune sweeps the grid serially and skips the cells whose probes show they cannot
+    change the best configuration (see _pruned_sweep), which stays that of the full
+    sweep; record_pruned keeps a 'pruned' row for each of them. The bounds only hold on
+    common random numbers, so a pruned sweep always runs with crn, and only the
+    bisection search can be pruned. It is experimental and often does not pay: the
+    probes cost simulations of their own, and on the grids tried the net saving ranged
+    from 36 of 150 simulations to none or a couple lost (simulations_saved < 0).
+
+    search='bayesian' hands over to bayesian_search, which treats the grid as bounds of
+    a continuous space and spends at most budget simulations; prescreen and prune do not
+    apply to it.
+
+    on_progress, if given, is called as on_progress(results, best, done, total) each
+    time a cell finishes (a batch for the Bayesian search), with that cell's results,
+    the best configuration so far and the number of cells done out of total. It runs
+    in the calling process, in the same order whatever the number of workers.
+
+    Returns a SearchResult holding every simulated configuration and the best one.
+    """
+    if search not in ('bisection', 'stochastic', 'bayesian'):
+        raise ValueError(f"Unknown search mode: {search}")
+    if prune:
+        if search != 'bisection':
+            raise ValueError("prune only applies to the bisection search")
+        crn = True
+    if search == 'bayesian':
+        return bayesian_search(
+            random_seed, num_parts, processing_times, machine_capacities, initial_inter_arrival_range,
+            budget=budget, workers=workers, crn=crn, backend=backend, tolerance=tolerance, on_progress=on_progress
+        )
+
+    grid = [
+        (machine_capacity, processing_time)
+        for machine_capacity in machine_capacities
+        for processing_time in processing_times
+    ]
+    screened = []
+    saved_per_cell = 0
+    if prescreen or prune:
+        # Imported here: queueing_models needs NumPy, which plain sweeps do without
+        import queueing_models
+        # What skipping one cell saves: exact for the halving search, a lower bound otherwise
+        saved_per_cell = 1 if search == 'stochastic' else 2 * queueing_models.bisection_iterations(initial_inter_arrival_range, tolerance, max_iterations)
+    if prescreen and grid:
+        keep = queueing_models.screen_grid(
+            machine_capacities, processing_times, initial_inter_arrival_range, tolerance, max_iterations
+        ).ravel()
+        screened = [cell for cell, kept in zip(grid, keep) if not kept]
+        grid = [cell for cell, kept in zip(grid, keep) if kept]
+
+    if search == 'stochastic':
+        cells = [
+            (search, (random_seed, num_parts, machine_capacity, processing_time, initial_inter_arrival_range, tolerance, max_iterations, backend))
+            for machine_capacity, processing_time in grid
+        ]
+    else:
+        cells = [
+            (search, (random_seed, num_parts, machine_capacity, processing_time, initial_inter_arrival_range, tolerance, max_iterations, crn, backend))
+            for machine_capacity, processing_time in grid
+        ]
+
+    # The stochastic search picks among its replicated estimates only
+    final_only = search == 'stochastic'
+    simulations_saved = saved_per_cell * len(screened)
+    if prune:
+        def pruned_cells():
+            nonlocal simulations_saved
+            for results, saved in _pruned_sweep(
+                cells, random_seed, num_parts, initial_inter_arrival_range, tolerance, max_iterations,
+                backend, saved_per_cell, record_pruned
+            ):
+                simulations_saved += saved
+                yield results
+        result = _merge_cells(num_parts, pruned_cells(), final_only, on_progress, len(cells))
+    elif workers == 1 or len(cells) <= 1:
+        result = _merge_cells(num_parts, map(_search_cell_args, cells), final_only, on_progress, len(cells))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            result = _merge_cells(num_parts, executor.map(_search_cell_args, cells), final_only, on_progress, len(cells))
+
+    result.screened = screened
+    result.simulations_saved = simulations_saved
+    return result
+
+def _pruned_sweep(cells, random_seed, num_parts, initial_inter_arrival_range, tolerance, max_iterations,
+                  backend, saved_per_cell, record_pruned, target_utilization=95, max_wait=5, utilization_margin=5):
+    """
+    Run the cells in grid order, skipping those that cannot change the best configuration.
+
+    On common random numbers the wait of every part and the utilization fall as the
+    inter-arrival window moves up, sample path by sample path. Every window the halving
+    search can reach lies between the heaviest (low, low + narrowest) and the lightest
+    (high - narrowest, high) one, so probing those two bounds the whole cell: no result
+    has a higher utilization than the heaviest probe, nor a lower wait than the lightest.
+
+    Before a cell is searched its probes are compared with the best configuration of
+    the cells before it. If nothing within those bounds could pass is_better against
+    it, the search is skipped; the heaviest probe alone settles cells that are busier
+    than the best (searched) or can neither meet the criteria nor match its utilization
+    (skipped). Skipped cells would not have changed the best, so the pruned sweep ends
+    with the same best as the full one. Probes are kept with status 'probe' and do not
+    compete for the best, since the full sweep has no such rows.
+
+    Probes cost simulations of their own, so a cell is only probed when the queueing
+    approximation gives it a chance: its predicted utilization at the heaviest window
+    must be under 100% (overloaded cells come close to it on any finite run) and at
+    most utilization_margin above the best. The predictions only decide where to probe,
+    never what to skip.
+
+    Cells do not rule each other out: utilization need not fall as machine_capacity
+    grows (a few fully loaded machines can finish later than many), so only a cell's
+    own windows are bounded.
+
+    Yields (results, simulations saved) for every cell, in grid order; the savings are
+    net of the probes, so a cell that is probed and then searched saves a negative number.
+    """
+    import queueing_models
+    low, high = initial_inter_arrival_range
+    narrowest = (high - low) / 2 ** queueing_models.bisection_iterations(initial_inter_arrival_range, tolerance, max_iterations)
+    heaviest, lightest = (low, low + narrowest), (high - narrowest, high)
+    _, predicted_utilization = queueing_models.predict(
+        [cell[1][2] for cell in cells], [cell[1][3] for cell in cells], heaviest
+    ) if cells else (None, [])
+    best = None
+
+    def probe(machine_capacity, processing_time, interval):
+        avg_waiting_time, machine_utilization = run_simulation(
+            random_seed, num_parts, interval, processing_time, machine_capacity, True, backend=backend
+        )
+        return SimulationResult(machine_capacity, processing_time, interval, avg_waiting_time, machine_utilization, status='probe')
+
+    def skippable(machine_capacity, processing_time, probes):
+        probes.append(probe(machine_capacity, processing_time, heaviest))
+        max_utilization = probes[0].machine_utilization
+        if max_utilization > best.machine_utilization:
+            return False
+        if max_utilization < best.machine_utilization and max_utilization < target_utilization:
+            return True
+        probes.append(probe(machine_capacity, processing_time, lightest))
+        min_wait = probes[1].avg_waiting_time
+        return min_wait >= best.avg_waiting_time or (max_utilization < best.machine_utilization and min_wait > max_wait)
+
+    for cell, predicted in zip(cells, predicted_utilization):
+        machine_capacity, processing_time = cell[1][2], cell[1][3]
+        probes = []
+        # Nothing to skip before there is a best, nor in a cell too narrow to search
+        worth_probing = best is not None and saved_per_cell > 0 and predicted < min(best.machine_utilization + utilization_margin, 100)
+        if worth_probing and skippable(machine_capacity, processing_time, probes):
+            pruned = SimulationResult(machine_capacity, processing_time, initial_inter_arrival_range,
+                                      None, None, replications=0, status='pruned')
+            yield probes + ([pruned] if record_pruned else []), saved_per_cell - len(probes)
+            continue
+
+        results = _search_cell_args(cell)
+        best = select_best(results, best)
+        yield probes + results, -len(probes)
+
+def _merge_cells(num_parts, cell_results, final_only=False, on_progress=None, total=None):
+    search = SearchResult(num_parts=num_parts)
+    for done, results in enumerate(cell_results, start=1):
+        search.results.extend(results)
+        simulated = [result for result in results if result.status == 'simulated']
+        # Replaying is_better cell by cell picks the same winner as one pass over all
+        search.best = select_best(simulated[-1:] if final_only else simulated, search.best)
+        if on_progress:
+            on_progress(results, search.best, done, total)
+    return search
+
+def bayesian_search(random_seed, num_parts, processing_times, machine_capacities, initial_inter_arrival_range, budget=40, batch_size=4,
+                    workers=1, crn=False, backend='simpy', tolerance=0.1, target_utilization=95, max_wait=5, on_progress=None):
+    """
+    Bayesian-optimization counterpart of find_best_configuration.
+
+    Instead of the discrete grid, the search space is continuous: machine capacity is
+    any integer between the smallest and largest of machine_capacities, the processing
+    time is any range whose lower bound and spread lie between those of
+    processing_times, and the interval is any sub-range of initial_inter_arrival_range
+    at least tolerance wide. Continuous values are rounded to two decimals.
+
+    A Gaussian-process surrogate (bayes_opt) of
+        min(utilization, target) - 20 * log(1 + max(0, wait - max_wait)) - 0.1 * wait
+    (flat across the configurations that meet both criteria, lower wait breaking ties)
+    proposes batch_size configurations at a time by expected improvement; each batch
+    is simulated in parallel when workers > 1. The search stops after budget
+    simulations, and the best result is picked with the usual selection rule among
+    the configurations that meet the criteria (all of them if none does).
+
+    on_progress is called after every batch, as in find_best_configuration, with the
+    number of simulations done out of budget.
+    """
+    import numpy as np
+    import bayes_opt
+
+    low_capacity, high_capacity = min(machine_capacities), max(machine_capacities)
+    processing_lows = [low for low, _ in processing_times]
+    processing_spreads = [high - low for low, high in processing_times]
+    interval_low, interval_high = initial_inter_arrival_range
+    min_width = min(tolerance, interval_high - interval_low)
+
+    def configuration(point):
+        point = point.tolist()
+        machine_capacity = int(round(low_capacity + point[0] * (high_capacity - low_capacity)))
+        processing_low = round(min(processing_lows) + point[1] * (max(processing_lows) - min(processing_lows)), 2)
+        processing_spread = round(min(processing_spreads) + point[2] * (max(processing_spreads) - min(processing_spreads)), 2)
+        start = round(interval_low + point[3] * (interval_high - min_width - interval_low), 2)
+        end = round(start + min_width + point[4] * (interval_high - min_width - start), 2)
+        return machine_capacity, (processing_low, round(processing_low + processing_spread, 2)), (start, end)
+
+    def position(machine_capacity, processing_time, interval):
+        # Inverse of configuration, with degenerate axes pinned to 0
+        def fraction(value, low, high):
+            return (value - low) / (high - low) if high > low else 0.0
+        start, end = interval
+        return [
+            fraction(machine_capacity, low_capacity, high_capacity),
+            fraction(processing_time[0], min(processing_lows), max(processing_lows)),
+            fraction(processing_time[1] - processing_time[0], min(processing_spreads), max(processing_spreads)),
+            fraction(start, interval_low, interval_high - min_width),
+            fraction(end - start - min_width, 0, interval_high - min_width - start),
+        ]
+
+    def snap(points):
+        # Only the rounded (integer capacity, two-decimal) configurations are distinct
+        return np.clip([position(*configuration(point)) for point in points], 0, 1)
+
+    def pick_best(results):
+        # Evaluation order is arbitrary here, so a later infeasible configuration with
+        # higher utilization must not displace one that meets the criteria
+        feasible = [result for result in results
+                    if result.machine_utilization >= target_utilization and result.avg_waiting_time <= max_wait]
+        return select_best(feasible or results)
+
+    def score(result):
+        excess = max(0.0, result.avg_waiting_time - max_wait)
+        return min(result.machine_utilization, target_utilization) - 20 * math.log1p(excess) - 0.1 * result.avg_waiting_time
+
+    rng = np.random.default_rng([random_seed, 13])
+    results, X, y = [], [], []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        points = snap(bayes_opt.latin_hypercube(min(budget, max(2 * batch_size, 8)), 5, rng))
+        while len(points):
+            args = [(random_seed, num_parts) + configuration(point) + (crn, backend) for point in points]
+            evaluated = executor.map(_evaluate_configuration, args) if executor else map(_evaluate_configuration, args)
+            batch = []
+            for point, result in zip(points, evaluated):
+                batch.append(result)
+                X.append(point)
+                y.append(score(result))
+            results.extend(batch)
+            if on_progress:
+                on_progress(batch, pick_best(results), len(results), budget)
+            remaining = budget - len(results)
+            if remaining <= 0:
+                break
+            points = bayes_opt.propose_batch(np.array(X), np.array(y), min(batch_size, remaining), rng, snap)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return SearchResult(num_parts=num_parts, results=results, best=pick_best(results))
+
+def _evaluate_configuration(args):
+    random_seed, num_parts, machine_capacity, processing_time, interval, crn, backend = args
+    avg_waiting_time, machine_utilization = run_simulation(
+        random_seed, num_parts, interval, processing_time, machine_capacity, crn, backend=backend
+    )
+    return SimulationResult(machine_capacity, processing_time, interval, avg_waiting_time, machine_utilization)
+
+def parse_parameters(random_seed, num_parts, machine_capacities, processing_times, initial_inter_arrival_range):
+    """
+    Convert the textual form/CLI parameters into find_best_configuration arguments.
+
+    Raises ValueError if any of the values is malformed.
     """
-    best_configuration = None
-    min_avg_waiting_time = float('inf')
-    max_utilization = 0
-    all_results = []
-
-    for machine_capacity in machine_capacities:
-        for processing_time in processing_times:
-            low, high = initial_inter_arrival_range
-            iteration = 0
-
-            while (high - low > tolerance) and (iteration < max_iterations):
-                iteration += 1
-                mid = (low + high) / 2
-                intervals = [(low, mid), (mid, high)]
-
-                for interval in intervals:
-                    avg_waiting_time, machine_utilization = run_simulation(
-                        random_seed, num_parts, interval, processing_time, machine_capacity
-                    )
-
-                    # Log the results
-                    result = {
-                        'machine_capacity': machine_capacity,
-                        'processing_time': processing_time,
-                        'interval': interval,
-                        'avg_waiting_time': avg_waiting_time,
-                        'machine_utilization': machine_utilization
-                    }
-                    all_results.append(result)
-
-                    # Check if this configuration meets criteria
-                    if machine_utilization >= 95 and avg_waiting_time <= 5:
-                        if avg_waiting_time < min_avg_waiting_time or machine_utilization > max_utilization:
-                            min_avg_waiting_time = avg_waiting_time
-                            max_utilization = machine_utilization
-                            best_configuration = (machine_capacity, num_parts, interval, processing_time)
-
-                    # If not optimal, choose the best among them
-                    elif machine_utilization > max_utilization or (machine_utilization == max_utilization and avg_waiting_time < min_avg_waiting_time):
-                        min_avg_waiting_time = avg_waiting_time
-                        max_utilization = machine_utilization
-                        best_configuration = (machine_capacity, num_parts, interval, processing_time)
-
-                # Narrow down the range
-                if best_configuration and best_configuration[2] == (low, mid):
-                    high = mid
-                else:
-                    low = mid
-
-    return best_configuration, min_avg_waiting_time, max_utilization, all_results
+    return {
+        'random_seed': int(random_seed),
+        'num_parts': int(num_parts),
+        'machine_capacities': [int(capacity) for capacity in str(machine_capacities).split(',')],
+        'processing_times': [parse_range(pt) for pt in str(processing_times).split(',')],
+        'initial_inter_arrival_range': parse_range(initial_inter_arrival_range),
+    }
+
+def parse_range(text):
+    """Parses "low-high" into a (low, high) tuple of floats."""
+    low, high = (float(value) for value in str(text).split('-'))
+    return low, high
 
 if __name__ == "__main__":
     # Extract parameters from command-line arguments
-    random_seed = int(sys.argv[1])
-    num_parts = int(sys.argv[2])
-    machine_capacities = list(map(int, sys.argv[3].split(',')))
-    processing_times = [tuple(map(float, pt.split('-'))) for pt in sys.argv[4].split(',')]
-    initial_inter_arrival_range = tuple(map(float, sys.argv[5].split('-')))
-
-    best_configuration, min_avg_waiting_time, max_utilization, all_results = find_best_configuration(
-        random_seed, num_parts, processing_times, machine_capacities, initial_inter_arrival_range
+    parser = argparse.ArgumentParser(description="Find the best machine configuration for a fixed number of parts.")
+    parser.add_argument('random_seed')
+    parser.add_argument('num_parts')
+    parser.add_argument('machine_capacities', help="e.g. 4,6,8")
+    parser.add_argument('processing_times', help="e.g. 4-6,5-7")
+    parser.add_argument('initial_inter_arrival_range', help="e.g. 1.0-10.0")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for the grid (0 = one per CPU)")
+    parser.add_argument('--crn', action='store_true', help="Use common random numbers for interval comparisons")
+    parser.add_argument('--backend', choices=['simpy', 'numpy'], default='simpy', help="Simulation engine")
+    parser.add_argument('--search', choices=['bisection', 'stochastic', 'bayesian'], default='bisection', help="Search over the inter-arrival range (stochastic: implies --crn, usually 5-25%% fewer runs; bayesian: over the whole continuous space)")
+    parser.add_argument('--budget', type=int, default=40, help="Simulation budget of --search bayesian")
+    parser.add_argument('--prescreen', action='store_true', help="Skip cells the analytic approximation rules out")
+    parser.add_argument('--no-cache', action='store_true', help="Always simulate, ignoring cached results")
+    parser.add_argument('--prune', action='store_true', help="Experimental: skip cells that cannot change the best, often saving nothing (bisection only, implies --crn)")
+    parser.add_argument('--arrival-mode', choices=['process', 'token'], help="How the SimPy backend models parts (same results, token is faster)")
+    parser.add_argument('--profile', action='store_true', help="Profile every run (serial, uncached) and write a report and collapsed stacks")
+    parser.add_argument('--profiler', choices=['cprofile', 'sampling'], default='cprofile', help="cProfile plus stack sampling, or stack sampling alone (lower overhead)")
+    parser.add_argument('--profile-output', default='simulation_profile', help="File prefix for the --profile report (.txt) and stacks (.collapsed)")
+    args = parser.parse_args()
+    if args.no_cache:
+        # Also reaches worker processes that re-import this module
+        os.environ['SIMULATION_CACHE_ENTRIES'] = '0'
+        RESULT_CACHE.enabled = False
+    if args.arrival_mode:
+        os.environ['SIMULATION_ARRIVAL_MODE'] = args.arrival_mode
+        ARRIVAL_MODE = args.arrival_mode
+    if args.profile:
+        import profiling
+        # Profile every run in this process: no worker pool, no cached results
+        PROFILER = profiling.Profiler(use_cprofile=args.profiler == 'cprofile')
+        args.workers = 1
+        RESULT_CACHE.enabled = False
+    phase = PROFILER.phase if PROFILER else (lambda name: nullcontext())
+
+    params = parse_parameters(
+        args.random_seed, args.num_parts, args.machine_capacities, args.processing_times, args.initial_inter_arrival_range
     )
 
-    # Print all results
-    for result in all_results:
-        print(f"Testing machine_capacity={result['machine_capacity']}, processing_time={result['processing_time']}, interval={result['interval']}")
-        print(f"Results: Average Waiting Time={result['avg_waiting_time']:.2f} minutes, Machine Utilization={result['machine_utilization']:.2f}%")
-        print("-" * 60)
+    with phase('search'):
+        search = find_best_configuration(
+            params['random_seed'], params['num_parts'], params['processing_times'],
+            params['machine_capacities'], params['initial_inter_arrival_range'],
+            workers=args.workers or None, crn=args.crn, backend=args.backend, search=args.search,
+            prescreen=args.prescreen, prune=args.prune, budget=args.budget
+        )
+        best = search.best
+        if best:
+            # Reruns the best configuration on the streams the search used: it did not track percentiles
+            summary = run_summary(
+                params['random_seed'], params['num_parts'], best.interval, best.processing_time, best.machine_capacity,
+                crn=args.crn or args.prune or args.search == 'stochastic', backend=args.backend, percentiles=True
+            )
 
-    # Print the best result
-    if best_configuration:
-        print(f"Best Configuration: machine_capacity={best_configuration[0]}, num_parts={best_configuration[1]}, inter_arrival_time={best_configuration[2]}, processing_time={best_configuration[3]}")
-        print(f"Best Results: Average Waiting Time={min_avg_waiting_time:.2f} minutes, Machine Utilization={max_utilization:.2f}%")
-    else:
-        print("No configuration met the criteria.")
+    with phase('output'):
+        # Print all results
+        for result in search.results:
+            if result.status != 'simulated':
+                continue
+            print(f"Testing machine_capacity={result.machine_capacity}, processing_time={result.processing_time}, interval={result.interval}")
+            print(f"Results: Average Waiting Time={result.avg_waiting_time:.2f} minutes, Machine Utilization={result.machine_utilization:.2f}%")
+            print("-" * 60)
+
+        # Print the best result
+        best_configuration = search.best_configuration
+        if best_configuration:
+            print(f"Best Configuration: machine_capacity={best_configuration[0]}, num_parts={best_configuration[1]}, inter_arrival_time={best_configuration[2]}, processing_time={best_configuration[3]}")
+            print(f"Best Results: Average Waiting Time={search.min_avg_waiting_time:.2f} minutes, Machine Utilization={search.max_utilization:.2f}%")
+            print(f"Best Wait Percentiles: p50={summary.wait_p50:.2f}, p95={summary.wait_p95:.2f}, p99={summary.wait_p99:.2f} minutes")
+        else:
+            print("No configuration met the criteria.")
+        print(f"Simulations run: {search.simulations}")
+        if search.screened:
+            print(f"Cells screened out: {len(search.screened)}")
+        if search.simulations_saved:
+            print(f"Simulations saved: {search.simulations_saved}")
+        sys.stdout.flush()
+
+    if PROFILER:
+        PROFILER.close()
+        # The report goes to stderr so stdout stays parseable by the desktop apps
+        print(PROFILER.report(), file=sys.stderr)
+        with open(f"{args.profile_output}.txt", 'w') as report:
+            report.write(PROFILER.report(top=100) + "\n")
+        PROFILER.write_collapsed(f"{args.profile_output}.collapsed")
+        print(f"Profile written to {args.profile_output}.txt and {args.profile_output}.collapsed", file=sys.stderr)
@@ -0,0 +1,118 @@
+"""
+Tests of the Flask app's job API, run against the real JobRunner and JobStore.
+
+conftest.py points JOB_STORE at a temporary directory before the app is imported.
+"""
+import time
+
+import pytest
+
+import app
+from job_runner import JobRunner
+
+FORM = {
+    'random_seed': '5',
+    'num_parts': '200',
+    'machine_capacities': '1,2',
+    'processing_times': '1-2',
+    'initial_inter_arrival_range': '0.5-3',
+}
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def wait_for_job(client, job_id, timeout=60):
+    """The finished job's status document, once its sweep is also in the metrics."""
+    finished = sum(app.SWEEPS_FINISHED.value(kind='job', outcome=outcome) for outcome in ('done', 'failed'))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] not in ('queued', 'running') and job_id not in app.RUNNER:
+            # The worker records the outcome first, the metrics follow on the dispatcher thread
+            while sum(app.SWEEPS_FINISHED.value(kind='job', outcome=outcome) for outcome in ('done', 'failed')) <= finished:
+                assert time.monotonic() < deadline, f"Job {job_id} never reached the metrics"
+                time.sleep(0.05)
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish in {timeout}s")
+
+
+def test_overlapping_sweeps_share_the_result_cache(client):
+    hits = app.RESULT_CACHE_LOOKUPS.value(result='hit')
+    first = client.post('/jobs', data=dict(FORM, random_seed='11')).get_json()
+    assert wait_for_job(client, first['job_id'])['status'] == 'done'
+    assert app.RESULT_CACHE_LOOKUPS.value(result='hit') == hits
+
+    # A fresh worker process: the two cells it shares with the first sweep come from the file
+    second = client.post('/jobs', data=dict(FORM, random_seed='11', machine_capacities='1,2,3')).get_json()
+    assert wait_for_job(client, second['job_id'])['status'] == 'done'
+    assert app.RESULT_CACHE_LOOKUPS.value(result='hit') - hits >= 2
+
+
+def test_identical_jobs_are_coalesced(client):
+    coalesced = app.JOBS_COALESCED.value()
+    first = client.post('/jobs', data=dict(FORM, random_seed='21')).get_json()
+    in_flight = client.post('/jobs', data=dict(FORM, random_seed='21')).get_json()
+    assert wait_for_job(client, first['job_id'])['status'] == 'done'
+    finished = client.post('/jobs', data=dict(FORM, random_seed='21')).get_json()
+    other = client.post('/jobs', data=dict(FORM, random_seed='22')).get_json()
+    wait_for_job(client, other['job_id'])
+
+    assert not first['coalesced']
+    assert (in_flight['job_id'], in_flight['coalesced']) == (first['job_id'], True)
+    assert (finished['job_id'], finished['coalesced']) == (first['job_id'], True)
+    assert other['job_id'] != first['job_id'] and not other['coalesced']
+    assert app.JOBS_COALESCED.value() - coalesced == 2
+
+
+def test_orphaned_jobs_are_not_coalesced(client):
+    form = dict(FORM, random_seed='31')
+    # Left queued by a process that died: no runner of this one has it
+    orphan = app.JOB_STORE.create(form, app.sweep_key(app.parse_form(form)))
+
+    job = client.post('/jobs', data=form).get_json()
+    assert (job['job_id'], job['coalesced']) != (orphan, True)
+    wait_for_job(client, job['job_id'])
+
+
+def test_resumes_unfinished_jobs_on_the_first_request(client, monkeypatch):
+    job_id = app.JOB_STORE.create(dict(FORM, random_seed='41'))
+    app.JOB_STORE.start(job_id)
+    app.JOB_STORE.record_progress(job_id, [{'machine_capacity': 1}], None, 1, 2)
+    monkeypatch.setattr(app, '_resumed', False)
+
+    client.get('/metrics')
+    job = wait_for_job(client, job_id)
+    assert job['status'] == 'done'
+    # Requeued from scratch: the stale row is gone
+    assert job['progress']['done'] == job['progress']['total'] == 2
+    assert job['all_results'] and all('average_waiting_time' in row for row in job['all_results'])
+
+
+@pytest.fixture
+def full_runner(monkeypatch):
+    runner = JobRunner(max_workers=1, max_queued=0)
+    runner.submit('blocker', time.sleep, (60,))
+    monkeypatch.setattr(app, 'RUNNER', runner)
+    yield runner
+    runner.cancel('blocker')
+
+
+def test_jobs_answer_503_when_the_queue_is_full(client, full_runner):
+    form = dict(FORM, random_seed='51')
+    response = client.post('/jobs', data=form)
+
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) > 0
+    # The rejected job is not left queued for a later resume
+    assert app.JOB_STORE.find(app.sweep_key(app.parse_form(form)), app.RESULT_TTL) is None
+
+
+def test_sync_sweeps_answer_503_when_the_queue_is_full(client, full_runner):
+    response = client.post('/run_simulation', data=dict(FORM, random_seed='61', num_parts=str(app.INLINE_SWEEP_PARTS)))
+
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) > 0
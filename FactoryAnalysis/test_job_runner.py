@@ -0,0 +1,75 @@
+"""Tests of JobRunner's admission limit and of stopping jobs, run on real worker processes."""
+import time
+
+import pytest
+
+from job_runner import JobCancelled, JobFailed, JobRunner, JobTimeout, QueueFull
+
+
+def wait_until_running(runner, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while job_id not in runner._running:
+        assert time.monotonic() < deadline, f"Job {job_id} never started"
+        time.sleep(0.01)
+
+
+def test_returns_the_result_or_the_error():
+    runner = JobRunner(max_workers=2)
+    assert runner.submit('pow', pow, (2, 3)).result(timeout=30) == 8
+    with pytest.raises(JobFailed, match='ZeroDivisionError'):
+        runner.submit('divide', divmod, (1, 0)).result(timeout=30)
+    assert (runner.completed, runner.failed) == (1, 1)
+
+
+def test_rejects_jobs_beyond_the_queue_limit():
+    runner = JobRunner(max_workers=1, max_queued=1)
+    running = runner.submit('running', time.sleep, (60,))
+    queued = runner.submit('queued', time.sleep, (60,))
+    with pytest.raises(QueueFull) as rejected:
+        runner.submit('rejected', time.sleep, (60,))
+    assert rejected.value.retry_after > 0
+    assert runner.rejected == 1
+    # Resumed jobs were admitted before
+    forced = runner.submit('forced', time.sleep, (60,), force=True)
+
+    for job_id in ('forced', 'queued', 'running'):
+        assert runner.cancel(job_id)
+    for future in (running, queued, forced):
+        with pytest.raises(JobCancelled):
+            future.result(timeout=30)
+
+
+def test_cancel_kills_a_running_job():
+    runner = JobRunner(max_workers=1)
+    future = runner.submit('sleep', time.sleep, (60,))
+    wait_until_running(runner, 'sleep')
+    process = runner._running['sleep'].process
+
+    assert runner.cancel('sleep')
+    with pytest.raises(JobCancelled):
+        future.result(timeout=30)
+    assert not process.is_alive()
+    assert 'sleep' not in runner
+    assert not runner.cancel('sleep')
+
+
+def test_cancel_drops_a_queued_job():
+    runner = JobRunner(max_workers=1)
+    running = runner.submit('running', time.sleep, (60,))
+    queued = runner.submit('queued', time.sleep, (60,))
+
+    assert runner.cancel('queued')
+    with pytest.raises(JobCancelled):
+        queued.result(timeout=0)
+    runner.cancel('running')
+    with pytest.raises(JobCancelled):
+        running.result(timeout=30)
+
+
+def test_stops_jobs_that_time_out():
+    runner = JobRunner(max_workers=1, timeout=0.5)
+    started = time.monotonic()
+    with pytest.raises(JobTimeout):
+        runner.submit('sleep', time.sleep, (60,)).result(timeout=30)
+    assert time.monotonic() - started < 30
+    assert runner.timed_out == 1
@@ -0,0 +1,53 @@
+"""Tests of JobStore: what survives a restart, and which jobs find offers for reuse."""
+import pytest
+
+from job_store import JobStore
+
+PARAMS = {'random_seed': '1', 'num_parts': '100'}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_unfinished_jobs_survive_a_restart(store):
+    queued = store.create(PARAMS)
+    running = store.create(PARAMS)
+    store.start(running)
+    store.finish(store.create(PARAMS))
+
+    assert JobStore(store.path).unfinished() == [queued, running]
+
+
+def test_requeue_drops_partial_results(store):
+    job_id = store.create(PARAMS)
+    store.start(job_id)
+    store.record_progress(job_id, [{'machine_capacity': 1}, {'machine_capacity': 2}], {'machine_capacity': 2}, 1, 3)
+
+    store.requeue(job_id)
+
+    job = store.get(job_id)
+    assert (job['status'], job['done'], job['total'], job['best']) == ('queued', 0, None, None)
+    assert store.rows(job_id) == []
+    assert store.unfinished() == [job_id]
+
+
+def test_find_skips_jobs_nobody_runs(store):
+    job_id = store.create(PARAMS, key='k')
+
+    assert store.find('k', 60) == job_id
+    assert store.find('k', 60, owned=lambda job: True) == job_id
+    assert store.find('k', 60, owned=lambda job: False) is None
+    assert store.find('other', 60) is None
+
+
+def test_find_reuses_finished_jobs_for_max_age(store):
+    job_id = store.create(PARAMS, key='k')
+    store.finish(job_id)
+    failed = store.create(PARAMS, key='failed')
+    store.fail(failed, 'boom')
+
+    assert store.find('k', 60, owned=lambda job: False) == job_id
+    assert store.find('k', 0) is None
+    assert store.find('failed', 60) is None
@@ -0,0 +1,64 @@
+"""Tests of ResultCache's batched writes and the bounds of its memory and file tiers."""
+import time
+
+import pytest
+
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache.sqlite3')
+
+
+def test_writes_wait_for_a_full_batch(path):
+    writer = ResultCache(path, write_batch=3, flush_interval=3600)
+    writer.put('a', 1)
+    writer.put('b', 2)
+    assert writer.stats()['unwritten'] == 2
+    assert writer.get('a') == 1
+    assert ResultCache(path).get('a') is None
+
+    writer.put('c', 3)
+    assert writer.stats()['unwritten'] == 0
+    reader = ResultCache(path)
+    assert [reader.get(key) for key in 'abc'] == [1, 2, 3]
+    assert reader.disk_hits == 3
+
+
+def test_flush_writes_a_partial_batch(path):
+    writer = ResultCache(path, write_batch=64, flush_interval=3600)
+    writer.put('a', 1)
+    writer.flush()
+    assert ResultCache(path).get('a') == 1
+
+
+def test_the_file_keeps_the_newest_max_disk_entries(path):
+    writer = ResultCache(path, max_disk_entries=2, write_batch=1)
+    for key in 'abc':
+        writer.put(key, key)
+        # Distinct creation times, which decide what goes first
+        time.sleep(0.01)
+
+    reader = ResultCache(path)
+    assert [reader.get(key) for key in 'abc'] == [None, 'b', 'c']
+
+
+def test_expired_entries_are_not_served(path):
+    writer = ResultCache(path, write_batch=1)
+    writer.put('a', 1)
+    time.sleep(0.05)
+
+    assert ResultCache(path, max_age=0.01).get('a') is None
+    assert ResultCache(path).get('a') == 1
+
+
+def test_memory_keeps_the_most_recently_used(path):
+    cache = ResultCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert [cache.get(key) for key in 'abc'] == [1, None, 3]
+    assert cache.stats()['entries'] == 2
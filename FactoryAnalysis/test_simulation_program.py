@@ -0,0 +1,101 @@
+"""
+Consistency checks between the ways simulation_program can compute the same thing.
+
+    python -m pytest FactoryAnalysis
+
+Every test runs with the result cache off, so two paths that agree do so because
+they compute the same numbers, not because the second one read the first's result.
+"""
+import numpy as np
+import pytest
+
+import queue_engine
+import simulation_program
+
+GRID = {
+    'machine_capacities': [2, 4, 6, 8, 10, 12, 16],
+    'processing_times': [(1, 2), (2, 3), (4, 6), (1, 3)],
+    'initial_inter_arrival_range': (0.05, 3.0),
+}
+
+
+@pytest.fixture(autouse=True)
+def no_result_cache(monkeypatch):
+    # The environment variable reaches pool workers that re-import the module
+    monkeypatch.setenv('SIMULATION_CACHE_ENTRIES', '0')
+    monkeypatch.setattr(simulation_program.RESULT_CACHE, 'enabled', False)
+
+
+class Replay:
+    """Stands in for random.Random, handing out pre-drawn values in order."""
+
+    def __init__(self, values):
+        self._values = iter(values.tolist())
+
+    def uniform(self, low, high):
+        return next(self._values)
+
+
+@pytest.mark.parametrize('machine_capacity', [1, 3])
+def test_numpy_engine_matches_simpy_on_the_same_draws(monkeypatch, machine_capacity):
+    rng = np.random.default_rng(7)
+    inter_arrivals = rng.uniform(0.5, 1.5, 2000)
+    services = rng.uniform(1.0, 2.5 * machine_capacity, 2000)
+    # With crn the i-th part gets the i-th inter-arrival and the i-th service draw
+    monkeypatch.setattr(simulation_program, 'make_streams',
+                        lambda random_seed, crn=False, replication=0: (Replay(inter_arrivals), Replay(services)))
+
+    summary = simulation_program.run_summary(
+        0, 2000, (0.5, 1.5), (1.0, 2.5 * machine_capacity), machine_capacity, crn=True, use_cache=False
+    )
+    waits, makespan = queue_engine.fifo_waits(inter_arrivals, services, machine_capacity)
+
+    assert summary.avg_waiting_time == pytest.approx(waits.mean())
+    assert summary.max_waiting_time == pytest.approx(waits.max())
+    assert summary.machine_utilization == pytest.approx(services.sum() / (makespan * machine_capacity) * 100)
+    assert summary.avg_queue_length == pytest.approx(waits.sum() / makespan)
+
+
+@pytest.mark.parametrize('crn', [False, True])
+def test_token_and_process_arrival_modes_agree(crn):
+    runs = {
+        mode: simulation_program.run_summary(
+            3, 3000, (0.4, 1.0), (1.0, 3.0), 3, crn=crn, use_cache=False, arrival_mode=mode, percentiles=True
+        )
+        for mode in ('process', 'token')
+    }
+    assert runs['token'] == runs['process']
+
+
+def test_parallel_sweep_matches_serial():
+    sweeps = [
+        simulation_program.find_best_configuration(
+            1, 300, [(1, 2), (2, 3)], [2, 4, 6], (0.5, 3.0), workers=workers
+        )
+        for workers in (1, 2)
+    ]
+    serial, parallel = sweeps
+    assert [result.to_dict() for result in parallel.results] == [result.to_dict() for result in serial.results]
+    assert parallel.best == serial.best
+
+
+@pytest.mark.parametrize('random_seed', [1, 2])
+def test_prune_keeps_the_best_of_the_full_sweep(random_seed):
+    full = simulation_program.find_best_configuration(random_seed, 1000, crn=True, backend='numpy', **GRID)
+    pruned = simulation_program.find_best_configuration(random_seed, 1000, crn=True, backend='numpy', prune=True, **GRID)
+    assert pruned.best == full.best
+    assert pruned.simulations == full.simulations - pruned.simulations_saved
+
+
+def test_prune_requires_the_bisection_search():
+    with pytest.raises(ValueError):
+        simulation_program.find_best_configuration(1, 100, [(1, 2)], [2], (0.5, 3.0), search='stochastic', prune=True)
+
+
+def test_empty_runs_report_zeros_on_every_engine():
+    expected = (0, 0)
+    assert simulation_program.run_simulation(1, 0, (1, 2), (1, 2), 2, use_cache=False) == expected
+    assert queue_engine.simulate(1, 0, (1, 2), (1, 2), 2) == expected
+    avg_waiting_times, machine_utilizations = queue_engine.simulate_batch(1, 3, 0, (1, 2), (1, 2), 2)
+    assert avg_waiting_times.tolist() == [0, 0, 0]
+    assert machine_utilizations.tolist() == [0, 0, 0]
@@ -3,6 +3,7 @@ import random
 import logging
 import csv
 import ast  # Added to parse tuple strings
+from streaming_stats import WaitStatistics
 
 # Function to process a single batch with given parameters
 def parse_time_range(time_str):
@@ -64,7 +65,7 @@ def process_batch(env, name, params, resources, waiting_times):
 
     # Track total time
     total_time = env.now - arrival_time
-    waiting_times.append(total_time)
+    waiting_times.add(total_time)
     logging.info(f'{name} completes all processing at {env.now:.2f} (total time: {total_time:.2f} minutes).')
 
 def batch_generator(env, num_batches, inter_arrival_time_mean, params, resources, waiting_times):
@@ -76,8 +77,12 @@ def batch_generator(env, num_batches, inter_arrival_time_mean, params, resources
 
 # Function to run the simulation for one scenario
 def run_simulation(params):
+    return simulate_scenario(params)['mean']
+
+def simulate_scenario(params):
+    """Runs one scenario and returns the summary (mean, spread, p50/p95/p99) of the batch processing times."""
     env = simpy.Environment()
-    waiting_times = []
+    waiting_times = WaitStatistics()
     num_batches = int(params['Number of Batches'])
     inter_arrival_time_mean = float(params['Inter-Arrival Time Mean'])
 
@@ -97,9 +102,8 @@ def run_simulation(params):
     # Run the simulation
     env.run()
     
-    # Calculate average processing time
-    avg_processing_time = sum(waiting_times) / len(waiting_times) if waiting_times else 0
-    return avg_processing_time
+    # Running statistics: memory stays constant however many batches are simulated
+    return waiting_times.summary()
 
 def main():
     # Setup logging to a file
@@ -112,10 +116,17 @@ def main():
         for row in csv_reader:
             scenario_name = row['Scenario']
             logging.info(f"Starting simulation for {scenario_name}")
-            avg_time = run_simulation(row)
+            summary = simulate_scenario(row)
+            avg_time = summary['mean']
             logging.info(f"Completed simulation for {scenario_name}: Average Processing Time = {avg_time:.2f} minutes\n")
             # Include parameters with tuple strings in the results
-            result = {'Scenario': scenario_name, 'Average Processing Time': avg_time}
+            result = {
+                'Scenario': scenario_name,
+                'Average Processing Time': avg_time,
+                'P50 Processing Time': summary['p50'],
+                'P95 Processing Time': summary['p95'],
+                'P99 Processing Time': summary['p99'],
+            }
             result.update(row)
             results.append(result)
 
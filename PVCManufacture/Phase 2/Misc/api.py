@@ -1,17 +1,68 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, url_for
 import simpy
 import random
 import logging
 import datetime
 import io
 import csv
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from job_runner import JobCancelled, JobFailed, JobRunner, JobTimeout, QueueFull
+from metrics import CONTENT_TYPE, Registry
 
 app = Flask(__name__)
 
 SHIFTS_PER_DAY = 3  # Static variable for shifts per day
 
+# Every simulation runs in a process of its own: at most SIMULATION_WORKERS at a time
+# with SIMULATION_QUEUE_LIMIT more waiting, each for at most SIMULATION_TIMEOUT
+# seconds (0 for no limit). Workers import this module to find their function; the
+# forkserver does so once for all
+RUNNER = JobRunner(
+    int(os.environ.get('SIMULATION_WORKERS', 2)),
+    int(os.environ.get('SIMULATION_QUEUE_LIMIT', 16)),
+    float(os.environ.get('SIMULATION_TIMEOUT', 300)) or None,
+    preload=[__name__]
+)
+MAX_TRACKED_SIMULATIONS = 256
+simulations = OrderedDict()  # Futures of submitted simulations, by id
+_simulations_lock = threading.Lock()  # Request threads add, look up and forget entries concurrently
+
+# Operational metrics, served in the Prometheus text format on /metrics. Simulations
+# run in worker processes, which report their statistics back with their result
+METRICS = Registry()
+REQUESTS = METRICS.counter('http_requests_total', "HTTP requests by route, method and status", ('route', 'method', 'status'))
+REQUEST_LATENCY = METRICS.histogram('http_request_duration_seconds', "HTTP request latency by route and method", ('route', 'method'))
+SIMULATIONS_FINISHED = METRICS.counter('simulation_runs_total', "Simulations that ended, by outcome", ('outcome',))
+SIMULATION_DURATION = METRICS.histogram('simulation_duration_seconds', "Worker wall time of completed simulations")
+EVENTS = METRICS.counter('simulation_events_total', "SimPy events processed by completed simulations")
+SIMULATION_SECONDS = METRICS.counter('simulation_seconds_total', "Worker wall time of completed simulations; rate of events over rate of this is events/sec")
+EVENT_RATE = METRICS.gauge('simulation_events_per_second', "Events per second of the most recently completed simulation")
+METRICS.gauge('simulation_queue_depth', "Simulations waiting for a worker", function=lambda: RUNNER.queued)
+METRICS.gauge('simulation_workers_busy', "Simulations running", function=lambda: RUNNER.running)
+METRICS.gauge('simulation_workers_max', "Most simulations that run at once", function=lambda: RUNNER.max_workers)
+METRICS.gauge('simulation_worker_utilization', "Share of worker slots in use", function=lambda: RUNNER.running / RUNNER.max_workers)
+METRICS.counter('simulation_worker_busy_seconds_total', "Wall time worker slots spent on finished simulations", function=lambda: RUNNER.busy_seconds)
+METRICS.counter('simulations_rejected_total', "Simulations turned away because the queue was full", function=lambda: RUNNER.rejected)
+
+
+class CountingEnvironment(simpy.Environment):
+    """simpy.Environment that counts the events it processes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.event_count = 0
+
+    def step(self):
+        self.event_count += 1
+        super().step()
+
 # Define the simulation function
-def run_simulation(config):
+def run_simulation(config, stats=None):
+    """Runs one production simulation and returns its log; stats, if given, receives the event count."""
     global produced_kg, downtime_minutes  # Define as global variables
 
     # Extract configuration parameters
@@ -196,7 +247,7 @@ def run_simulation(config):
     maintenance_schedule = load_maintenance_schedule(MAINTENANCE_SCHEDULE_FILE)
 
     # Run simulation
-    env = simpy.Environment()
+    env = CountingEnvironment()
     env.process(production_simulation(env, NUM_LINES, maintenance_schedule))
     try:
         env.run()
@@ -222,15 +273,131 @@ def run_simulation(config):
     logging.info("_" * 50)
     logging.info("\n")
 
+    if stats is not None:
+        stats['events'] = env.event_count
+
     # Return log output
     log_output = log_stream.getvalue()
     return log_output
 
+def timed_simulation(config):
+    """run_simulation in a worker process: its log plus the statistics /metrics reports."""
+    stats = {}
+    start = time.perf_counter()
+    log_output = run_simulation(config, stats)
+    stats['seconds'] = time.perf_counter() - start
+    return {'log': log_output, 'stats': stats}
+
+def record_simulation(future):
+    """Adds a finished simulation to the metrics."""
+    error = future.exception()
+    if error is None:
+        outcome = 'done'
+    elif isinstance(error, JobCancelled):
+        outcome = 'cancelled'
+    elif isinstance(error, JobTimeout):
+        outcome = 'timeout'
+    else:
+        outcome = 'failed'
+    SIMULATIONS_FINISHED.inc(outcome=outcome)
+    if error is not None:
+        return
+    stats = future.result()['stats']
+    SIMULATION_DURATION.observe(stats['seconds'])
+    EVENTS.inc(stats['events'])
+    SIMULATION_SECONDS.inc(stats['seconds'])
+    if stats['seconds'] > 0:
+        EVENT_RATE.set(stats['events'] / stats['seconds'])
+
+def submit(simulation_id, config):
+    """Queues a simulation of config on RUNNER (QueueFull if the queue is full)."""
+    future = RUNNER.submit(simulation_id, timed_simulation, (config,))
+    future.add_done_callback(record_simulation)
+    return future
+
+def busy(error):
+    """503 response for a QueueFull error, telling the client when to retry."""
+    return jsonify({"error": str(error)}), 503, {'Retry-After': str(error.retry_after)}
+
+def simulation_status(simulation_id, future):
+    """Status document of a submitted simulation, with its log once it is done."""
+    if not future.done():
+        return {"id": simulation_id, "status": "running" if future.running() else "queued"}
+    error = future.exception()
+    if error is None:
+        return {"id": simulation_id, "status": "done", "log": future.result()['log']}
+    if isinstance(error, JobCancelled):
+        status = "cancelled"
+    elif isinstance(error, JobTimeout):
+        status = "timed_out"
+    else:
+        status = "failed"
+    return {"id": simulation_id, "status": status, "error": str(error)}
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Routes are labelled by their rule, so /simulations/<simulation_id> is one series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    REQUEST_LATENCY.observe(time.perf_counter() - g.request_started, route=route, method=request.method)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
 @app.route('/simulate', methods=['POST'])
 def simulate():
     config = request.json
-    log_output = run_simulation(config)
+    try:
+        log_output = submit(uuid.uuid4().hex, config).result()['log']
+    except QueueFull as e:
+        return busy(e)
+    except JobTimeout as e:
+        return jsonify({"error": f"Simulation timed out: {e}"}), 504
+    except (JobFailed, JobCancelled) as e:
+        return jsonify({"error": f"Simulation failed: {e}"}), 500
     return jsonify({"log": log_output})
 
+@app.route('/simulations', methods=['POST'])
+def submit_simulation():
+    """Queues a simulation and returns its id at once (202); poll GET /simulations/<id>."""
+    simulation_id = uuid.uuid4().hex
+    try:
+        future = submit(simulation_id, request.json)
+    except QueueFull as e:
+        return busy(e)
+    with _simulations_lock:
+        simulations[simulation_id] = future
+        # Forget the oldest finished simulations
+        for old_id in [old_id for old_id, future in simulations.items() if future.done()][:max(len(simulations) - MAX_TRACKED_SIMULATIONS, 0)]:
+            del simulations[old_id]
+    status_url = url_for('get_simulation', simulation_id=simulation_id)
+    return jsonify({"id": simulation_id, "status": "queued", "status_url": status_url}), 202, {'Location': status_url}
+
+@app.route('/simulations/<simulation_id>', methods=['GET'])
+def get_simulation(simulation_id):
+    with _simulations_lock:
+        future = simulations.get(simulation_id)
+    if future is None:
+        return jsonify({"error": f"Unknown simulation: {simulation_id}"}), 404
+    return jsonify(simulation_status(simulation_id, future))
+
+@app.route('/simulations/<simulation_id>/cancel', methods=['POST'])
+def cancel_simulation(simulation_id):
+    """Cancels a queued simulation, or kills the worker process of a running one."""
+    with _simulations_lock:
+        future = simulations.get(simulation_id)
+    if future is None:
+        return jsonify({"error": f"Unknown simulation: {simulation_id}"}), 404
+    if not RUNNER.cancel(simulation_id):
+        return jsonify({"error": f"Simulation {simulation_id} has already finished"}), 409
+    future.exception()  # Wait for the worker to be gone
+    return jsonify(simulation_status(simulation_id, future))
+
 if __name__ == '__main__':
     app.run(debug=True)